@@ -1,5 +1,6 @@
 
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
 import re
 import pandas
 from io import StringIO
@@ -22,8 +23,19 @@ def import_table(path: Path, sheetname = 0) -> pandas.DataFrame:
 		table = pandas.read_csv(path, sep = sep)
 	return table
 
-def annotate(tree_contents:str, table: pandas.DataFrame):
-	colorby = 'Category'
+# Splits a newick string into labels and the punctuation between them. Quoted labels and comments are kept whole.
+NEWICK_TOKEN_PATTERN = re.compile(r"('(?:[^']|'')*'|\[[^\]]*\]|[(),:;])")
+# Sequencing runs add a sample number to each sample id.
+LEAF_NAME_PATTERN = re.compile(r"^(?P<sample_id>.+)_S[\d]+$")
+
+def tokenize_newick(tree_contents: str) -> List[str]:
+	return [token for token in NEWICK_TOKEN_PATTERN.split(tree_contents) if token]
+
+def index_table(table: pandas.DataFrame) -> Dict[str, Tuple[str, Optional[str], Any]]:
+	"""
+		Maps each sample id in the table to the new label of its leaf, and the color and patient id used for its iTOL color range.
+		If a sample id appears in several rows, the first row is used.
+	"""
 	id_colormap = {
 		273: "#1d91c0",
 		653: "#225ea8",
@@ -34,43 +46,55 @@ def annotate(tree_contents:str, table: pandas.DataFrame):
 		62: "#f03b20",
 		214: "#fd8d3c"
 	}
-	city_colormap = {
-		'Philadelphia': "#fd8d3c",
-		'Los Angeles': "#1d91c0",
-		'Long Beach': "#225ea8",
-		'Washington': "#8c510a"
-	}
-	from pprint import pprint
-
-	itor_colors = list()
-	for index, row in table.iterrows():
+	index = dict()
+	for row in table.to_dict('records'):
 		sample_id = row['RepositoryNumber']
 		category = row['Category']
 		group = row['group #']
 		source = row['BugSource:']
 		city = row['City']
 
-		pattern = f"{sample_id}_S[\d]+"
-
 		if isinstance(category, str):
 			color = None
+			color_id = None
 			label = f"{sample_id}|{category}"
 		else:
 			color_id = row['PatientID']
-
-
 			color = id_colormap.get(color_id)
-
 			label = f"{sample_id}|{group}|{source}|{city}"
-			color_range = f"{label}\trange\t{color}\t{color_id}"
+		index.setdefault(f"{sample_id}", (label, color, color_id))
+	return index
 
-		#color_line = f"{label}\tbranch\t{color}\tnormal\t1"
-
-		tree_contents = re.sub(pattern, label, tree_contents)
+def annotate(tree_contents:str, table: pandas.DataFrame):
+	"""
+		Relabels the leaves of a newick tree with the data in `table` and builds the iTOL color ranges of the relabeled leaves.
+		The tree is tokenized once and each leaf is looked up by its sample id, so the tree is only scanned a single time.
+	Returns
+	-------
+	str
+		The relabeled tree.
+	List[str]
+		The iTOL TREE_COLORS lines, in the order the leaves appear in the tree.
+	"""
+	index = index_table(table)
+
+	tokens = tokenize_newick(tree_contents)
+	itor_colors = list()
+	for position, token in enumerate(tokens):
+		# Branch lengths follow a colon. Every other token that isn't punctuation or a comment is a node label.
+		if token in {'(', ')', ',', ':', ';'} or token.startswith('[') or (position and tokens[position - 1] == ':'):
+			continue
+		quoted = token.startswith("'")
+		name = token[1:-1] if quoted else token.strip()
+		match = LEAF_NAME_PATTERN.match(name)
+		if not match or match.group('sample_id') not in index:
+			continue
+		label, color, color_id = index[match.group('sample_id')]
+		tokens[position] = f"'{label}'" if quoted else label
 		if color is not None:
-			itor_colors.append(color_range)
+			itor_colors.append(f"{label}\trange\t{color}\t{color_id}")
 
-	return tree_contents, itor_colors
+	return "".join(tokens), itor_colors
 
 
 
@@ -1,41 +1,226 @@
-from typing import List, Dict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Dict, Match, Optional, Pattern, Tuple
 from pathlib import Path
+import argparse
+import hashlib
+import itertools
+import re
+import shutil
+import sys
+import time
 import pandas
-import pendulum
-from pprint import pprint
-def load_annotations(filename:Path, key_column:str):
+from expand_globs import expand_globs
+def parse_annotations(table: pandas.DataFrame) -> Tuple[pandas.DataFrame, Dict[str, int]]:
+	"""
+		Builds the "{patientid}-{sample}-{date}" label of each row of the annotation table.
+	Parameters
+	----------
+	table: pandas.DataFrame
+		Should have the 'PatientID', 'group #' and 'CultureDate' columns.
+
+	Returns
+	-------
+	pandas.DataFrame
+		The rows with a valid PatientID, with their label in the 'label' column.
+	Dict[str, int]
+		The number of rows rejected for each reason.
+	"""
+	patient_ids = pandas.to_numeric(table['PatientID'], errors = 'coerce')
+	rejections = {
+		'missing PatientID': table['PatientID'].isna(),
+		'PatientID is not a number': table['PatientID'].notna() & patient_ids.isna(),
+		'PatientID is not a whole number': patient_ids.notna() & (patient_ids % 1 != 0)
+	}
+	rejected = pandas.concat(rejections, axis = 1).any(axis = 1)
+	table = table[~rejected]
+
+	# Whole numbers read from a column with missing values are floats, and shouldn't be labeled as '3.0'.
+	groups = table['group #'].map(str)
+	group_numbers = pandas.to_numeric(table['group #'], errors = 'coerce')
+	whole_groups = group_numbers.notna() & (group_numbers % 1 == 0)
+	groups[whole_groups] = group_numbers[whole_groups].astype('int64').map(str)
+
+	# Dates are either read as datetimes by excel or written as ISO 8601 text. Anything else is left blank.
+	dates = pandas.to_datetime(table['CultureDate'], format = 'ISO8601', errors = 'coerce').dt.strftime('%Y-%m-%d').fillna('')
+
+	labels = patient_ids[~rejected].astype('int64').map(str) + '-' + groups + '-' + dates
+	table = table.assign(label = labels)
+	rejection_counts = {reason: int(selection.sum()) for reason, selection in rejections.items() if selection.any()}
+	return table, rejection_counts
+
+def read_annotation_table(filename: Path) -> pandas.DataFrame:
+	""" Reads the annotation table and keeps the rows that can be labeled."""
 	table = pandas.read_excel(filename)
+	table, rejection_counts = parse_annotations(table)
+	if rejection_counts:
+		print(f"Rejected {sum(rejection_counts.values())} rows of {filename}:")
+		for reason, count in rejection_counts.items():
+			print(f"\t{reason}: {count}")
+	return table
 
-	data = dict()
-	for index, row in table.iterrows():
-		key = row[key_column]
-		try:
-			patientid = int(row['PatientID'])
-		except:
-			continue
-		sample = row['group #']
-		date = row["CultureDate"]
-		try:
-			date: pendulum.DateTime = pendulum.parse(str(date))
-			date = date.to_date_string()
-		except:
-			date = ""
-		string = f"{patientid}-{sample}-{date}"
-
-		data[key] = string
-		data[row['groupId']] = string
+def get_annotations(table: pandas.DataFrame, key_column: str) -> Dict[Any, str]:
+	""" Maps the values of `key_column` and 'groupId' in a table from `read_annotation_table` to the label of their row."""
+	# Later rows take precedence, and each row's groupId is added right after its key.
+	labels = table['label'].tolist()
+	pairs = zip(zip(table[key_column].tolist(), labels), zip(table['groupId'].tolist(), labels))
+	data = dict(itertools.chain.from_iterable(pairs))
 	return data
 
+def get_label_colors(table: pandas.DataFrame) -> Dict[str, Tuple[str, int]]:
+	"""
+		Maps each label to the iTOL color of its patient and the patient id. The color is derived from the patient id,
+		so a patient has the same color in every tree.
+	"""
+	label_colors = dict()
+	for label, patient_id in zip(table['label'].tolist(), table['PatientID'].tolist()):
+		patient_id = int(float(patient_id))
+		digest = hashlib.md5(str(patient_id).encode()).digest()
+		r, g, b = (100 + value * 155 // 255 for value in digest[:3])
+		label_colors[label] = (f"#{r:>02X}{g:>02X}{b:>02X}", patient_id)
+	return label_colors
+
+def load_annotations(filename:Path, key_column:str) -> Dict[Any, str]:
+	""" Maps the values of `key_column` and 'groupId' in the annotation table to the label of their row."""
+	return get_annotations(read_annotation_table(filename), key_column)
+
+def build_pattern(keys: List[str]) -> Pattern:
+	"""
+		Compiles the keys into a single regex shaped like a trie, so each position of the text is only compared
+		against the keys that share its prefix. At any position the longest matching key is used.
+	"""
+	trie = dict()
+	for key in keys:
+		node = trie
+		for character in key:
+			node = node.setdefault(character, dict())
+		node[''] = True
+
+	def to_regex(node: Dict[str, Any]) -> str:
+		branches = [re.escape(character) + to_regex(child) for character, child in sorted(node.items()) if character]
+		if not branches:
+			return ''
+		pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+		if '' in node:
+			# The key ending here is only used if none of the longer keys match. The quantifier is greedy.
+			pattern = '(?:' + pattern + ')?'
+		return pattern
+
+	return re.compile(to_regex(trie))
+
+
+def clean_annotations(annotations: Dict[Any, str]) -> Dict[str, str]:
+	return {str(key): str(value) for key, value in annotations.items() if not pandas.isna(key) and str(key)}
+
+def relabel_treefile(treefile: Path, output: Path, annotations: Dict[str, str], pattern: Optional[Pattern]) -> List[str]:
+	"""
+		Writes the treefile to `output` with every match of `pattern` replaced by its value in `annotations`.
+	Returns
+	-------
+	List[str]
+		The labels that were used, in the order they first appear in the treefile.
+	"""
+	if pattern is None:
+		shutil.copyfile(treefile, output)
+		return []
+	used = dict()
+
+	def replace(match: Match) -> str:
+		label = annotations[match.group(0)]
+		used[label] = None
+		return label
+
+	with treefile.open() as input_file, output.open('w') as output_file:
+		for line in input_file:
+			output_file.write(pattern.sub(replace, line))
+	return list(used)
+
 def apply_annotations(treefile:Path, annotations:Dict[str,str]):
-	contents = treefile.read_text()
-	for key, value in annotations.items():
-		contents = contents.replace(key, value)
-	treefile.with_suffix('.annotated.treefile').write_text(contents)
+	"""
+		Replaces every key of `annotations` in the treefile with its value in a single pass. Where keys overlap the longest
+		one is used, and replaced text is never matched again. The treefile is read and written one line at a time.
+	"""
+	annotations = clean_annotations(annotations)
+	pattern = build_pattern(list(annotations)) if annotations else None
+	relabel_treefile(treefile, treefile.with_suffix('.annotated.treefile'), annotations, pattern)
+
+# The annotations of each worker process in batch mode. The pattern is compiled once per worker rather than once per treefile.
+_worker_state: Dict[str, Any] = dict()
+
+def _initialize_worker(annotations: Dict[str, str], label_colors: Dict[str, Tuple[str, int]]):
+	_worker_state['annotations'] = annotations
+	_worker_state['label_colors'] = label_colors
+	_worker_state['pattern'] = build_pattern(list(annotations)) if annotations else None
+
+def _annotate_treefile(treefile: Path) -> Dict[str, Any]:
+	""" Relabels a single treefile in a worker and saves the iTOL colors of its labels."""
+	start = time.perf_counter()
+	label_colors = _worker_state['label_colors']
+	labels = relabel_treefile(treefile, treefile.with_suffix('.annotated.treefile'), _worker_state['annotations'], _worker_state['pattern'])
+
+	color_lines = ["TREE_COLORS", "SEPARATOR TAB", "DATA"]
+	for label in labels:
+		color, patient_id = label_colors[label]
+		color_lines.append(f"{label}\trange\t{color}\t{patient_id}")
+	treefile.with_suffix('.colors.txt').write_text("\n".join(color_lines) + "\n")
+
+	return {
+		'treefile': treefile,
+		'size': treefile.stat().st_size,
+		'labels': len(labels),
+		'seconds': time.perf_counter() - start
+	}
+
+def annotate_treefiles(treefiles: List[Path], annotation_file: Path, key_column: str = 'group #', jobs: int = 1) -> List[Dict[str, Any]]:
+	"""
+		Relabels each treefile with a single copy of the annotation table. Each treefile gets an '.annotated.treefile'
+		and an iTOL '.colors.txt' file next to it.
+	Parameters
+	----------
+	treefiles: List[Path]
+	annotation_file: Path
+		The table with the labels of each sample. It is only read once.
+	key_column: str
+		The column with the sample names used in the treefiles.
+	jobs: int
+		The number of treefiles to relabel at the same time.
+
+	Returns
+	-------
+	List[Dict[str, Any]]
+		The size, the number of labels used and the time taken for each treefile.
+	"""
+	table = read_annotation_table(annotation_file)
+	annotations = clean_annotations(get_annotations(table, key_column))
+	label_colors = get_label_colors(table)
+
+	if jobs <= 1:
+		_initialize_worker(annotations, label_colors)
+		return [_annotate_treefile(treefile) for treefile in treefiles]
+	with ProcessPoolExecutor(max_workers = jobs, initializer = _initialize_worker, initargs = (annotations, label_colors)) as executor:
+		return list(executor.map(_annotate_treefile, treefiles))
+
+def create_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(description = "Relabels the samples in one or more treefiles using an annotation table.")
+	parser.add_argument("annotations", help = "The annotation table (merged_table.xlsx).", type = Path)
+	parser.add_argument(
+		"treefiles",
+		help = "The treefiles to relabel. Glob patterns such as 'models/*/*.treefile' are expanded.",
+		nargs = '+'
+	)
+	parser.add_argument("--key-column", help = "The column with the sample names used in the treefiles.", default = 'group #')
+	parser.add_argument("-j", "--jobs", help = "The number of treefiles to relabel in parallel.", type = int, default = 1)
+	return parser
 
 if __name__ == "__main__":
-	treefile = Path("/media/cld100/FA86364B863608A1/Users/cld100/Storage/projects/lipuma/sibling_pair_a/SC1360 phylogeny/K2P+ASC+R2/breseq.snp.fasta.treefile")
-	annotation_file = Path("/media/cld100/FA86364B863608A1/Users/cld100/Storage/projects/lipuma/docs/merged_table.xlsx")
+	args = create_parser().parse_args()
+
+	treefiles = [i for i in expand_globs(args.treefiles) if not i.name.endswith('.annotated.treefile')]
+	if not treefiles:
+		print("No treefiles match", " ".join(args.treefiles))
+		sys.exit(1)
 
-	annotations = load_annotations(annotation_file, 'group #')
-	pprint(annotations)
-	apply_annotations(treefile, annotations)
\ No newline at end of file
+	start = time.perf_counter()
+	results = annotate_treefiles(treefiles, args.annotations, args.key_column, args.jobs)
+	for result in results:
+		print(f"{result['seconds']:>8.2f}s\t{result['size'] / 1e6:>8.1f} MB\t{result['labels']:>6} labels\t{result['treefile']}")
+	print(f"Annotated {len(results)} treefiles in {time.perf_counter() - start:.2f}s")
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+	Writes BGZF (blocked gzip) files and the tabix index used to query them by coordinate.
+	The output can be read by any gzip reader and indexed/queried with htslib, tabix, bcftools or pysam.
+"""
+import struct
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, List, Tuple, Union
+
+# The maximum amount of uncompressed data in a single block. Matches htslib, which leaves room for incompressible data.
+BLOCK_SIZE = 0xff00
+# An empty block marks the end of a BGZF file.
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+# The size of the windows in the linear index.
+LINEAR_WINDOW_SHIFT = 14
+
+
+def compress_block(data: bytes, level: int = 6) -> bytes:
+	""" Compresses up to `BLOCK_SIZE` bytes into a single BGZF block."""
+	compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+	compressed = compressor.compress(data) + compressor.flush()
+	# The header is a gzip header with the 'BC' extra field, which holds the size of the whole block minus one.
+	header = struct.pack('<4BI2BH2BHH', 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(compressed) + 25)
+	footer = struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+	return header + compressed + footer
+
+
+class BgzfWriter:
+	"""
+		Writes a BGZF file one block at a time, so only a single block is ever held in memory.
+	Parameters
+	----------
+	filename: Union[str, Path]
+		The output file.
+	level: int
+		The zlib compression level.
+	"""
+	def __init__(self, filename: Union[str, Path], level: int = 6):
+		self.filename = Path(filename)
+		self.level = level
+		self._handle: BinaryIO = open(self.filename, 'wb')
+		self._buffer = bytearray()
+		# The offset of the current block in the compressed file.
+		self._block_offset = 0
+
+	def __enter__(self) -> 'BgzfWriter':
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def tell(self) -> int:
+		""" The virtual offset of the next byte: the offset of its block in the compressed file, shifted by 16 bits, plus its offset in the block."""
+		return (self._block_offset << 16) | len(self._buffer)
+
+	def write(self, data: Union[str, bytes]) -> None:
+		if isinstance(data, str):
+			data = data.encode()
+		self._buffer += data
+		while len(self._buffer) >= BLOCK_SIZE:
+			self._write_block(bytes(self._buffer[:BLOCK_SIZE]))
+			del self._buffer[:BLOCK_SIZE]
+
+	def _write_block(self, data: bytes) -> None:
+		block = compress_block(data, self.level)
+		self._handle.write(block)
+		self._block_offset += len(block)
+
+	def close(self) -> None:
+		if self._handle.closed: return
+		if self._buffer:
+			self._write_block(bytes(self._buffer))
+			self._buffer.clear()
+		self._handle.write(EOF_BLOCK)
+		self._handle.close()
+
+
+def region_to_bin(begin: int, end: int) -> int:
+	""" The smallest bin of the UCSC binning scheme that contains the 0-based, half-open interval [begin, end)."""
+	end -= 1
+	if begin >> 14 == end >> 14: return ((1 << 15) - 1) // 7 + (begin >> 14)
+	if begin >> 17 == end >> 17: return ((1 << 12) - 1) // 7 + (begin >> 17)
+	if begin >> 20 == end >> 20: return ((1 << 9) - 1) // 7 + (begin >> 20)
+	if begin >> 23 == end >> 23: return ((1 << 6) - 1) // 7 + (begin >> 23)
+	if begin >> 26 == end >> 26: return ((1 << 3) - 1) // 7 + (begin >> 26)
+	return 0
+
+
+class TabixIndex:
+	"""
+		Builds a tabix (.tbi) index while the records of a sorted BGZF file are written.
+		Only the bins and the linear index are kept in memory, never the records themselves.
+	Parameters
+	----------
+	preset: str
+		Only 'vcf' is supported.
+	"""
+	def __init__(self, preset: str = 'vcf'):
+		if preset != 'vcf':
+			raise ValueError(f"Unsupported tabix preset: {preset}")
+		self.names: List[str] = list()
+		# One (bins, linear index) pair per reference sequence, in the order they appear in the file.
+		self._references: List[Tuple[Dict[int, List[List[int]]], List[int]]] = list()
+		self._current = None
+
+	def add(self, name: str, begin: int, end: int, start_offset: int, end_offset: int) -> None:
+		"""
+			Adds a record to the index. Records must be added in the order they are written, grouped by reference and sorted by position.
+		Parameters
+		----------
+		name: str
+			The reference sequence (CHROM) of the record.
+		begin, end: int
+			The 0-based, half-open interval covered by the record.
+		start_offset, end_offset: int
+			The virtual offsets of the start of the record and of the byte after it.
+		"""
+		if name != self._current:
+			if name in self.names:
+				raise ValueError(f"The records of '{name}' are not contiguous.")
+			self.names.append(name)
+			self._references.append((dict(), list()))
+			self._current = name
+		bins, linear_index = self._references[-1]
+
+		chunks = bins.setdefault(region_to_bin(begin, end), list())
+		if chunks and chunks[-1][1] == start_offset:
+			chunks[-1][1] = end_offset
+		else:
+			chunks.append([start_offset, end_offset])
+
+		first_window = begin >> LINEAR_WINDOW_SHIFT
+		last_window = max(end - 1, begin) >> LINEAR_WINDOW_SHIFT
+		if len(linear_index) <= last_window:
+			linear_index.extend([0] * (last_window + 1 - len(linear_index)))
+		for window in range(first_window, last_window + 1):
+			if linear_index[window] == 0:
+				linear_index[window] = start_offset
+
+	def write(self, filename: Union[str, Path]) -> None:
+		""" Saves the index. It is itself a BGZF file."""
+		names = b''.join(name.encode() + b'\0' for name in self.names)
+		with BgzfWriter(filename) as index_file:
+			# magic, n_ref, format (2 = VCF), col_seq, col_beg, col_end, meta character, lines to skip, l_nm
+			index_file.write(b'TBI\1' + struct.pack('<8i', len(self.names), 2, 1, 2, 0, ord('#'), 0, len(names)) + names)
+			for bins, linear_index in self._references:
+				index_file.write(struct.pack('<i', len(bins)))
+				for bin_number in sorted(bins):
+					chunks = bins[bin_number]
+					index_file.write(struct.pack('<Ii', bin_number, len(chunks)))
+					for start_offset, end_offset in chunks:
+						index_file.write(struct.pack('<QQ', start_offset, end_offset))
+				# Windows without records point to the previous window's first record.
+				for window in range(1, len(linear_index)):
+					if linear_index[window] == 0:
+						linear_index[window] = linear_index[window - 1]
+				index_file.write(struct.pack('<i', len(linear_index)))
+				index_file.write(struct.pack(f'<{len(linear_index)}Q', *linear_index))
+			# The number of records without coordinates.
+			index_file.write(struct.pack('<Q', 0))
@@ -0,0 +1,465 @@
+"""
+	Benchmarks breseq_parser.py against synthetic breseq output folders.
+	The `generate` command writes a set of analysis folders (index.html or output.gd) with a configurable size,
+	and the `run` command times each phase of the parser and saves the results as a JSON report so that
+	runs from different commits can be compared with `--compare`.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import breseq_parser
+
+NUCLEOTIDES = 'ACGT'
+SEQ_IDS = ['NC_000913', 'pEXAMPLE1']
+GENES = ['araC', 'thrL', 'yaaA', 'nhaR', 'rpoB', 'gyrA', 'ompF', 'fliC']
+SAVE_FORMATS = ['xlsx', 'csv', 'tsv', 'parquet', 'vcf', 'sqlite']
+
+INDEX_HEADER = """<html>
+<head><title>BRESEQ :: Mutation Predictions</title></head>
+<body>
+<!-- Output Predicted Mutations -->
+<p>
+<table border="0" cellspacing="1" cellpadding="3">
+<tr><th colspan="{span}" align="left" class="mutation_header_row">Predicted mutations</th></tr>
+<tr><th>evidence</th><th>seq&nbsp;id</th><th>position</th><th>mutation</th>{frequency}<th>annotation</th><th>gene</th><th width="100%">description</th></tr>
+<!-- Item Lines -->
+"""
+INDEX_COVERAGE_HEADER = """</table>
+<p>
+<table border="0" cellspacing="1" cellpadding="3" width="100%">
+<tr><th align="left" class="missing_coverage_header_row" colspan="11">Unassigned missing coverage evidence</th></tr>
+<tr><th>&nbsp;</th><th>&nbsp;</th><th>seq&nbsp;id</th><th>start</th><th>end</th><th>size</th><th>&larr;cov</th><th>cov&rarr;</th><th>gene</th><th width="100%">description</th></tr>
+"""
+INDEX_JUNCTION_HEADER = """</table>
+<p>
+<table border="0" cellspacing="1" cellpadding="3">
+<tr><th align="left" class="new_junction_header_row" colspan="12">Unassigned new junction evidence</th></tr>
+<tr><th>&nbsp;</th><th>seq&nbsp;id</th><th>position</th><th>reads (cov)</th><th>reads (cov)</th><th>score</th><th>skew</th><th>freq</th><th>annotation</th><th>gene</th><th width="100%">product</th></tr>
+"""
+INDEX_FOOTER = """</table>
+</body>
+</html>
+"""
+
+
+def _random_mutation(random_state: random.Random, genome_size: int) -> Dict[str, Any]:
+	reference = random_state.choice(NUCLEOTIDES)
+	return {
+		'seq_id':    random_state.choice(SEQ_IDS),
+		'position':  random_state.randint(1, genome_size),
+		'reference': reference,
+		'alternate': random_state.choice([i for i in NUCLEOTIDES if i != reference]),
+		'gene':      random_state.choice(GENES),
+		# Roughly half of the mutations in a polymorphism run are below fixation.
+		'frequency': random_state.choice([1.0, 1.0, round(random_state.uniform(0.05, 0.95), 3)])
+	}
+
+
+def generate_index_file(mutations: List[Dict[str, Any]], coverage: List[Dict[str, Any]], junctions: List[Dict[str, Any]], polymorphism: bool) -> str:
+	""" Formats the mutations and evidence as the tables of a breseq index.html file."""
+	lines = [INDEX_HEADER.format(span = 8 if polymorphism else 7, frequency = "<th>freq</th>" if polymorphism else "")]
+	for index, mutation in enumerate(mutations):
+		row_class = 'polymorphism_table_row' if mutation['frequency'] < 1 else 'normal_table_row'
+		frequency_cell = '<td align="right">{:g}%</td>'.format(round(mutation['frequency'] * 100, 1)) if polymorphism else ''
+		lines.append(
+			'<tr class="{row_class}">\n'
+			'<td align="center"><a href="evidence/RA_{index}.html">RA</a></td><!-- Evidence -->\n'
+			'<td align="center">{seq_id}</td><!-- Seq_Id -->\n'
+			'<td align="right">{position:,}</td><!-- Position -->\n'
+			'<td align="center">{reference}&rarr;{alternate}</td><!-- Cell Mutation -->\n'
+			'{frequency_cell}<td align="center">L{codon}F&nbsp;(<font class="snp_type_nonsynonymous">C</font>TT&rarr;TTT)&nbsp;</td>\n'
+			'<td align="center"><i>{gene}</i>&nbsp;&rarr;</td>\n'
+			'<td align="left">hypothetical&nbsp;protein</td>\n'
+			'</tr>\n'.format(row_class = row_class, index = index, frequency_cell = frequency_cell, codon = mutation['position'] % 300, **mutation)
+		)
+
+	lines.append(INDEX_COVERAGE_HEADER)
+	for index, item in enumerate(coverage):
+		lines.append(
+			'<tr>\n'
+			'<td align="center"><a href="evidence/MC_SIDE_1_{index}.html">*</a></td><td align="center"><a href="evidence/MC_SIDE_2_{index}.html">*</a></td>\n'
+			'<td align="center">{seq_id}</td><td align="right">{start:,}</td><td align="right">{end:,}</td><td align="right">{size:,}</td>'
+			'<td align="center">12 [0]</td><td align="center">[0] 15</td><td align="center"><i>[{gene}]</i></td><td align="left">1 gene</td></tr>\n'.format(
+				index = index, size = item['end'] - item['start'] + 1, **item
+			)
+		)
+
+	lines.append(INDEX_JUNCTION_HEADER)
+	for index, item in enumerate(junctions):
+		lines.append(
+			'<tr class="mutation_table_row">\n'
+			'<td align="center" rowspan="2"><a href="evidence/JC_{index}.html">*</a></td><td align="center"><a href="evidence/JC_1_{index}.html">?</a></td>'
+			'<td align="center">{seq_id}</td><td align="center">{start:,}&nbsp;=</td><td align="center">10 (0.5)</td>'
+			'<td align="center" rowspan="2">22 (1.1)</td><td align="center" rowspan="2">14/152</td><td align="center" rowspan="2">0.4</td>'
+			'<td align="center" rowspan="2">100%</td><td align="center">intergenic (&#8209;12/+3)</td><td align="center">{gene}&nbsp;&rarr;</td>'
+			'<td align="left" rowspan="2">hypothetical</td></tr>\n'
+			'<tr class="mutation_table_row"><td align="center"><a href="evidence/JC_2_{index}.html">?</a></td><td align="center">{seq_id}</td>'
+			'<td align="center">=&nbsp;{end:,}</td><td align="center">12 (0.6)</td><td align="center">coding (3/300&nbsp;nt)</td>'
+			'<td align="center">{gene}&nbsp;&rarr;</td></tr>\n'.format(index = index, **item)
+		)
+	lines.append(INDEX_FOOTER)
+	return "".join(lines)
+
+
+def generate_genomediff(mutations: List[Dict[str, Any]], coverage: List[Dict[str, Any]], junctions: List[Dict[str, Any]]) -> str:
+	""" Formats the mutations and evidence as a breseq output.gd file."""
+	lines = ["#=GENOME_DIFF\t1.0", "#=AUTHOR\tbreseq_benchmark"]
+	evidence = list()
+	evidence_id = len(mutations) + 1
+	for index, mutation in enumerate(mutations, start = 1):
+		lines.append(
+			"SNP\t{index}\t{evidence_id}\t{seq_id}\t{position}\t{alternate}\tfrequency={frequency:g}\tgene_name={gene}"
+			"\tgene_product=hypothetical protein\tsnp_type=intergenic".format(index = index, evidence_id = evidence_id, **mutation)
+		)
+		evidence.append(
+			"RA\t{evidence_id}\t.\t{seq_id}\t{position}\t0\t{reference}\t{alternate}\tfrequency={frequency:g}".format(evidence_id = evidence_id, **mutation)
+		)
+		evidence_id += 1
+	for item in coverage:
+		evidence.append(
+			"MC\t{evidence_id}\t.\t{seq_id}\t{start}\t{end}\t0\t0\tgene_name=[{gene}]\tgene_product=1 gene\tleft_inside_cov=0"
+			"\tleft_outside_cov=12\tright_inside_cov=0\tright_outside_cov=15".format(evidence_id = evidence_id, **item)
+		)
+		evidence_id += 1
+	for item in junctions:
+		evidence.append(
+			"JC\t{evidence_id}\t.\t{seq_id}\t{start}\t-1\t{seq_id}\t{end}\t1\t0\tfrequency=1\tmax_pos_hash_score=152"
+			"\tneg_log10_pos_hash_p_value=0.4\tnew_junction_coverage=1.1\tnew_junction_read_count=22\tpos_hash_score=14"
+			"\tside_1_coverage=0.5\tside_1_gene_name={gene} →\tside_1_gene_position=intergenic (‑12/+3)\tside_1_gene_product=hypothetical"
+			"\tside_1_read_count=10\tside_2_coverage=0.6\tside_2_gene_name={gene} →\tside_2_gene_position=coding (3/300 nt)"
+			"\tside_2_read_count=12".format(evidence_id = evidence_id, **item)
+		)
+		evidence_id += 1
+	return "\n".join(lines + evidence) + "\n"
+
+
+def generate_dataset(folder: Path, samples: int = 10, mutations: int = 1000, polymorphism: bool = False, coverage: int = 10, junctions: int = 10,
+		filetype: str = 'html', genome_size: int = 5000000, shared: float = 0.5, seed: int = 0) -> List[Path]:
+	"""
+		Writes a set of synthetic breseq analysis folders.
+	Parameters
+	----------
+	folder: Path
+		The folder to write the analysis folders to. Created if it does not exist.
+	samples: int
+		The number of analysis folders.
+	mutations: int
+		The number of predicted mutations in each sample.
+	polymorphism: bool
+		Whether the samples were run in polymorphism mode. Adds the frequency column and mutations below fixation.
+	coverage, junctions: int
+		The number of unassigned missing coverage and new junction evidence items in each sample.
+	filetype: {'html', 'gd'}
+		Whether each analysis folder has an output/index.html or an output/output.gd file.
+	genome_size: int
+		The largest generated position.
+	shared: float
+		The fraction of each sample's mutations that are taken from a pool shared between samples, so that the
+		comparison table has sites found in several samples.
+	seed: int
+		Seed for the random number generator. The same arguments always generate the same files.
+
+	Returns
+	-------
+		The analysis folders.
+	"""
+	random_state = random.Random(seed)
+	shared_pool = [_random_mutation(random_state, genome_size) for _ in range(max(mutations, 1))]
+	analysis_folders = list()
+	for sample_index in range(samples):
+		number_shared = int(mutations * shared)
+		sample_mutations = random_state.sample(shared_pool, number_shared)
+		sample_mutations += [_random_mutation(random_state, genome_size) for _ in range(mutations - number_shared)]
+		if not polymorphism:
+			sample_mutations = [dict(mutation, frequency = 1.0) for mutation in sample_mutations]
+		sample_mutations.sort(key = lambda mutation: (mutation['seq_id'], mutation['position']))
+
+		sample_coverage = list()
+		for _ in range(coverage):
+			start = random_state.randint(1, genome_size - 5000)
+			sample_coverage.append({'seq_id': SEQ_IDS[0], 'start': start, 'end': start + random_state.randint(50, 5000), 'gene': random_state.choice(GENES)})
+		sample_junctions = list()
+		for _ in range(junctions):
+			start = random_state.randint(1, genome_size - 5000)
+			sample_junctions.append({'seq_id': SEQ_IDS[0], 'start': start, 'end': start + random_state.randint(100, 5000), 'gene': random_state.choice(GENES)})
+
+		analysis_folder = folder / "sample{:04d}".format(sample_index)
+		output_folder = analysis_folder / "output"
+		output_folder.mkdir(parents = True, exist_ok = True)
+		if filetype == 'gd':
+			(output_folder / "output.gd").write_text(generate_genomediff(sample_mutations, sample_coverage, sample_junctions), encoding = 'utf-8')
+		else:
+			(output_folder / "index.html").write_text(generate_index_file(sample_mutations, sample_coverage, sample_junctions, polymorphism), encoding = 'utf-8')
+		analysis_folders.append(analysis_folder)
+	return analysis_folders
+
+
+def _git_commit() -> Optional[str]:
+	try:
+		process = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = Path(__file__).parent, capture_output = True, text = True, check = True)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return process.stdout.strip()
+
+
+class BenchmarkRunner:
+	"""
+		Times each phase of breseq_parser on a folder of analysis folders.
+	Parameters
+	----------
+	folder: Path
+		A folder of breseq analysis folders, such as one made by `generate_dataset`.
+	repeat: int
+		The number of times each phase is run. The fastest run is reported.
+	verbose: bool
+		Whether to show the output of breseq_parser.
+	"""
+	def __init__(self, folder: Path, repeat: int = 1, verbose: bool = False):
+		self.folder = Path(folder)
+		self.repeat = max(repeat, 1)
+		self.verbose = verbose
+		self.phases: List[Dict[str, Any]] = list()
+
+	def _measure(self, name: str, function: Callable[[], Any], items: Union[float, Callable[[Any], float]] = None, unit: str = None) -> Any:
+		"""
+			Runs `function` `repeat` times and records the fastest wall time, the CPU time and the peak RSS afterwards.
+			`items` is the amount of work done by the phase, used to calculate the throughput. It can also be a function of the result.
+		"""
+		timings = list()
+		result = None
+		for _ in range(self.repeat):
+			output = contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+			with output:
+				wall_start, cpu_start = time.perf_counter(), time.process_time()
+				result = function()
+				timings.append((time.perf_counter() - wall_start, time.process_time() - cpu_start))
+		seconds, cpu_seconds = min(timings)
+		_, peak_rss = breseq_parser.Profiler._memory()
+		phase = {
+			'name':        name,
+			'seconds':     seconds,
+			'cpu_seconds': cpu_seconds,
+			'runs':        [wall for wall, _ in timings],
+			# The peak never decreases, so this is the peak of the whole run up to the end of this phase. `None` on Windows.
+			'peak_rss_mb': peak_rss
+		}
+		if callable(items):
+			items = items(result)
+		if items is not None:
+			phase['items'] = items
+			phase['unit'] = unit
+			phase['throughput'] = items / seconds if seconds else None
+		self.phases.append(phase)
+		print("{:<16}{:>10.3f} s{:>15}{}".format(
+			name, seconds, '-' if peak_rss is None else "{:.1f} MB".format(peak_rss),
+			"{:>14,.0f} {}/s".format(phase['throughput'], unit) if phase.get('throughput') else ''
+		))
+		return result
+
+	def run(self, formats: List[str] = None, jobs: int = 1) -> Dict[str, Any]:
+		"""
+			Times each phase of the parser.
+			- discovery: finding the source file of each analysis folder.
+			- parse: reading the index.html or output.gd files.
+			- extraction: converting the parsed rows into the snp, coverage and junction tables.
+			- breseq: parsing with `Breseq`, including building the DataFrames, with the result cache disabled.
+			- comparison: generating the snp comparison table.
+			- save:<format>: saving the tables in each format.
+		Parameters
+		----------
+		formats: List[str]
+			The output formats to time. Defaults to every format.
+		jobs: int
+			The number of processes used by the `breseq` phase.
+
+		Returns
+		-------
+			The benchmark report.
+		"""
+		if formats is None:
+			formats = SAVE_FORMATS
+		self.phases = list()
+		folders = sorted(i for i in self.folder.iterdir() if i.is_dir() and not i.name.startswith('.'))
+
+		sources = self._measure('discovery', lambda: [breseq_parser.Breseq.findSourceFile(i) for i in folders], len(folders), 'folders')
+		sources = [(folder, source) for folder, source in zip(folders, sources) if source is not None]
+		input_bytes = sum(source.stat().st_size for _, source in sources)
+
+		def parse():
+			parsed = list()
+			for folder, source in sources:
+				if source.suffix == '.gd':
+					parsed.append((folder, source, list(breseq_parser.iterGenomeDiff(source))))
+				else:
+					parsed.append((folder, source, breseq_parser.Breseq._parseIndexFile(source)))
+			return parsed
+
+		parsed = self._measure('parse', parse, input_bytes / 1024 ** 2, 'MB')
+
+		def extract():
+			snp_tables, coverage_tables, junction_tables = breseq_parser._emptyTables()
+			for folder, source, result in parsed:
+				if source.suffix == '.gd':
+					tables = breseq_parser.Breseq._buildGenomeDiffTables(folder.name, result)
+				else:
+					snp_headers, snp_rows, coverage_rows, junction_rows = result
+					tables = (
+						breseq_parser.Breseq._parsePredictedMutations(folder.name, snp_headers, snp_rows),
+						breseq_parser.Breseq._parseCoverage(folder.name, coverage_rows),
+						breseq_parser.Breseq._parseJunctions(folder.name, junction_rows)
+					)
+				snp_tables.extend(tables[0])
+				coverage_tables.extend(tables[1])
+				junction_tables.extend(tables[2])
+			return snp_tables.toDataFrame(), coverage_tables.toDataFrame(), junction_tables.toDataFrame()
+
+		snp_table, _, _ = self._measure('extraction', extract, lambda tables: len(tables[0]), 'rows')
+
+		def parse_all():
+			breseq = breseq_parser.Breseq(self.folder, jobs = jobs, use_cache = False)
+			# The tables are built the first time they are used.
+			breseq.snp_table, breseq.coverage_table, breseq.junction_table
+			return breseq
+
+		breseq = self._measure('breseq', parse_all, len(sources), 'samples')
+
+		def compare():
+			# The comparison table is a cached property, so it is cleared to time it again.
+			breseq.__dict__.pop('comparison_table', None)
+			return breseq.comparison_table
+
+		comparison_table = self._measure('comparison', compare, len(snp_table), 'rows')
+
+		def save(filename: Path, filetype: str):
+			# A database that already has the samples would have them replaced, which is slower than creating it.
+			if filetype == 'sqlite':
+				filename.with_suffix('.sqlite').unlink(missing_ok = True)
+			breseq.save(filename, filetype)
+
+		with tempfile.TemporaryDirectory() as output_folder:
+			for filetype in formats:
+				filename = Path(output_folder) / filetype / 'breseq_output'
+				filename.parent.mkdir()
+				self._measure('save:' + filetype, partial(save, filename, filetype), len(snp_table), 'rows')
+
+		return {
+			'created':        time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'commit':         _git_commit(),
+			'python':         platform.python_version(),
+			'platform':       platform.platform(),
+			'folder':         str(self.folder),
+			'samples':        len(sources),
+			'input_bytes':    input_bytes,
+			'snp_rows':       len(snp_table),
+			'comparison_sites': 0 if comparison_table is None else len(comparison_table),
+			'repeat':         self.repeat,
+			'jobs':           jobs,
+			'phases':         self.phases
+		}
+
+
+def compare_reports(report: Dict[str, Any], previous: Dict[str, Any], threshold: float = 0.1) -> List[str]:
+	"""
+		Compares the phases of two benchmark reports.
+	Parameters
+	----------
+	report, previous: Dict[str, Any]
+		The current and the previous report.
+	threshold: float
+		Phases that are slower by more than this fraction are marked as regressions.
+
+	Returns
+	-------
+		The names of the phases that regressed.
+	"""
+	previous_phases = {phase['name']: phase for phase in previous['phases']}
+	regressions = list()
+	print("{:<16}{:>12}{:>12}{:>10}".format('phase', 'previous', 'current', 'change'))
+	for phase in report['phases']:
+		old = previous_phases.get(phase['name'])
+		if old is None or not old['seconds']:
+			continue
+		change = phase['seconds'] / old['seconds'] - 1
+		flag = ''
+		if change > threshold:
+			regressions.append(phase['name'])
+			flag = '  slower'
+		print("{:<16}{:>10.3f} s{:>10.3f} s{:>+9.0%}{}".format(phase['name'], old['seconds'], phase['seconds'], change, flag))
+	return regressions
+
+
+def create_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(description = "Generates synthetic breseq output and benchmarks breseq_parser.py against it.")
+	subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+	dataset_parser = argparse.ArgumentParser(add_help = False)
+	dataset_parser.add_argument("--samples", help = "Number of analysis folders.", type = int, default = 10)
+	dataset_parser.add_argument("--mutations", help = "Number of predicted mutations per sample.", type = int, default = 1000)
+	dataset_parser.add_argument("--polymorphism", help = "Generate samples run in polymorphism mode.", action = 'store_true')
+	dataset_parser.add_argument("--coverage", help = "Number of missing coverage evidence items per sample.", type = int, default = 10)
+	dataset_parser.add_argument("--junctions", help = "Number of new junction evidence items per sample.", type = int, default = 10)
+	dataset_parser.add_argument("--input-format", help = "The file in each analysis folder.", choices = ['html', 'gd'], default = 'html', dest = 'input_format')
+	dataset_parser.add_argument("--seed", help = "Seed for the random number generator.", type = int, default = 0)
+
+	generate_parser = subparsers.add_parser('generate', parents = [dataset_parser], help = "Write a synthetic dataset.")
+	generate_parser.add_argument("-o", "--output", help = "The folder to write the analysis folders to.", type = Path, required = True, dest = 'output')
+
+	run_parser = subparsers.add_parser('run', parents = [dataset_parser], help = "Benchmark the parser.")
+	run_parser.add_argument(
+		"-d", "--directory",
+		help = "A folder of analysis folders. If not given, a dataset is generated in a temporary folder using the dataset options.",
+		type = Path,
+		dest = 'directory'
+	)
+	run_parser.add_argument("-f", "--formats", help = "Output formats to time.", nargs = '*', choices = SAVE_FORMATS, default = SAVE_FORMATS)
+	run_parser.add_argument("-j", "--jobs", help = "Number of processes used to run `Breseq`.", type = int, default = 1)
+	run_parser.add_argument("--repeat", help = "Number of times to run each phase. The fastest run is reported.", type = int, default = 1)
+	run_parser.add_argument("-o", "--output", help = "Filename of the JSON report.", type = Path, dest = 'output')
+	run_parser.add_argument("--compare", help = "A previous JSON report to compare against.", type = Path, dest = 'compare')
+	run_parser.add_argument("--threshold", help = "Slowdown (as a fraction) reported as a regression. Defaults to 0.1.", type = float, default = 0.1)
+	run_parser.add_argument("-v", "--verbose", help = "Show the output of breseq_parser.", action = 'store_true')
+	return parser
+
+
+def main(arguments: List[str] = None) -> int:
+	args = create_parser().parse_args(arguments)
+	dataset_options = dict(
+		samples = args.samples, mutations = args.mutations, polymorphism = args.polymorphism, coverage = args.coverage,
+		junctions = args.junctions, filetype = args.input_format, seed = args.seed
+	)
+	if args.command == 'generate':
+		folders = generate_dataset(args.output, **dataset_options)
+		print("Wrote {} analysis folders to {}".format(len(folders), args.output))
+		return 0
+
+	with contextlib.ExitStack() as stack:
+		folder = args.directory
+		if folder is None:
+			folder = Path(stack.enter_context(tempfile.TemporaryDirectory()))
+			generate_dataset(folder, **dataset_options)
+		report = BenchmarkRunner(folder, repeat = args.repeat, verbose = args.verbose).run(args.formats, jobs = args.jobs)
+	if args.directory is None:
+		report['dataset'] = dataset_options
+
+	if args.output:
+		args.output.write_text(json.dumps(report, indent = 4))
+		print("Saved the report to ", args.output)
+	if args.compare:
+		regressions = compare_reports(report, json.loads(args.compare.read_text()), args.threshold)
+		return 1 if regressions else 0
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
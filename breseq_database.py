@@ -0,0 +1,256 @@
+"""
+	Stores the tables parsed by breseq_parser.py in a local SQLite database so that mutations can be looked up
+	by gene, region, sample or mutation type across every cohort that has been loaded.
+	Use `breseq_parser.py -f sqlite -o mutations.sqlite` to add a directory of samples to a database, and the
+	commands of this script to query it:
+		python breseq_database.py mutations.sqlite gene rpoB
+		python breseq_database.py mutations.sqlite region NC_000913 1000 5000
+"""
+import argparse
+import csv
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import breseq_parser
+
+SQL_TYPES = {
+	'category': 'TEXT',
+	'str':      'TEXT',
+	'int':      'INTEGER',
+	'float':    'REAL'
+}
+TABLE_SCHEMAS = {
+	'snp':      dict(breseq_parser.SNP_SCHEMA, **{'mutation type': 'str'}),
+	'coverage': breseq_parser.COVERAGE_SCHEMA,
+	'junction': breseq_parser.JUNCTION_SCHEMA
+}
+INDEXES = [
+	('snp_site', 'snp', ['seq id', 'position']),
+	('snp_sample', 'snp', ['Sample']),
+	('snp_mutation_type', 'snp', ['mutation type']),
+	('snp_gene_gene', 'snp_gene', ['gene']),
+	('snp_gene_snp', 'snp_gene', ['snp_id']),
+	('coverage_site', 'coverage', ['seq id', 'start']),
+	('coverage_sample', 'coverage', ['Sample']),
+	('junction_sample', 'junction', ['Sample'])
+]
+# The characters that separate the gene names in the 'gene' column, such as 'yaaA ← / → yaaB' or '[yaaA]–[yaaB]'.
+GENE_SEPARATORS = re.compile(r"[\s\[\]←→/–,;]+")
+
+
+def quote(identifier: str) -> str:
+	""" Quotes a column name. Most of the column names from breseq have spaces or symbols."""
+	return '"{}"'.format(identifier.replace('"', '""'))
+
+
+def split_genes(gene: Optional[str]) -> List[str]:
+	""" Splits the 'gene' column into the names of the genes it mentions."""
+	if not gene:
+		return []
+	return [name for name in GENE_SEPARATORS.split(gene) if name and name not in ('-', '–')]
+
+
+class MutationDatabase:
+	"""
+		A SQLite database of snp, coverage and junction tables from any number of runs of breseq_parser.
+		Samples are identified by name. Loading a sample that is already in the database replaces its rows.
+	Parameters
+	----------
+	filename: Union[str, Path]
+		The database file. Created if it does not exist.
+	"""
+	def __init__(self, filename: Union[str, Path]):
+		self.filename = Path(filename)
+		self.connection = sqlite3.connect(str(self.filename))
+		self._create()
+
+	def __enter__(self) -> 'MutationDatabase':
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def close(self) -> None:
+		self.connection.close()
+
+	def _create(self) -> None:
+		with self.connection:
+			self.connection.execute("CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY, directory TEXT, loaded TEXT, parser_version INTEGER)")
+			self.connection.execute("CREATE TABLE IF NOT EXISTS samples (sample TEXT PRIMARY KEY, run_id INTEGER)")
+			for table, schema in TABLE_SCHEMAS.items():
+				columns = ", ".join("{} {}".format(quote(name), SQL_TYPES[kind]) for name, kind in schema.items())
+				self.connection.execute("CREATE TABLE IF NOT EXISTS {} (run_id INTEGER, {})".format(table, columns))
+			# One row per gene named in the 'gene' column of each snp row, so mutations can be looked up by gene.
+			self.connection.execute("CREATE TABLE IF NOT EXISTS snp_gene (snp_id INTEGER, gene TEXT COLLATE NOCASE)")
+			for name, table, columns in INDEXES:
+				self.connection.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(name, table, ", ".join(map(quote, columns))))
+
+	def _columns(self, table: str) -> List[str]:
+		return [row[1] for row in self.connection.execute("PRAGMA table_info({})".format(table))]
+
+	def _add_columns(self, table: str, columns: Iterable[str]) -> None:
+		""" Adds any columns that breseq_parser found but are not part of the table yet, such as extra columns in newer breseq versions."""
+		existing = set(self._columns(table))
+		for column in columns:
+			if column not in existing:
+				self.connection.execute("ALTER TABLE {} ADD COLUMN {} TEXT".format(table, quote(column)))
+
+	def remove_samples(self, samples: Iterable[str]) -> None:
+		""" Deletes every row of the given samples."""
+		samples = [(sample,) for sample in samples]
+		self.connection.executemany("DELETE FROM snp_gene WHERE snp_id IN (SELECT rowid FROM snp WHERE Sample = ?)", samples)
+		for table in list(TABLE_SCHEMAS) + ['samples']:
+			column = 'sample' if table == 'samples' else 'Sample'
+			self.connection.executemany("DELETE FROM {} WHERE {} = ?".format(table, column), samples)
+
+	def add_tables(self, tables: Dict[str, breseq_parser.TableBuilder], directory: Union[str, Path] = None) -> int:
+		"""
+			Loads the tables of a run of breseq_parser in a single transaction.
+		Parameters
+		----------
+		tables: Dict[str, TableBuilder]
+			The 'snp', 'coverage' and 'junction' tables, such as `Breseq.builders`.
+		directory: Union[str, Path]
+			The directory the samples were parsed from. Recorded in the runs table.
+
+		Returns
+		-------
+			The id of the run.
+		"""
+		samples = {sample for table in tables.values() for sample in table.values('Sample') if sample is not None}
+		with self.connection:
+			cursor = self.connection.execute(
+				"INSERT INTO runs (directory, loaded, parser_version) VALUES (?, ?, ?)",
+				(None if directory is None else str(Path(directory).absolute()), time.strftime('%Y-%m-%dT%H:%M:%S'), breseq_parser.PARSER_VERSION)
+			)
+			run_id = cursor.lastrowid
+			self.remove_samples(samples)
+			self.connection.executemany("INSERT INTO samples (sample, run_id) VALUES (?, ?)", [(sample, run_id) for sample in sorted(samples)])
+
+			for name, table in tables.items():
+				columns = table.columns()
+				# Cohorts without unassigned evidence have empty coverage or junction tables, and there is nothing to insert.
+				if len(table) == 0 or not columns:
+					continue
+				values = {column: table.values(column) for column in columns}
+				if name == 'snp':
+					columns = columns + ['mutation type']
+					values['mutation type'] = [breseq_parser.mutationType(mutation) for mutation in values.get('mutation', [None] * len(table))]
+				self._add_columns(name, columns)
+				rows = zip(*(values[column] for column in columns))
+				if name != 'snp':
+					insert = "INSERT INTO {} (run_id, {}) VALUES (?, {})".format(name, ", ".join(map(quote, columns)), ", ".join('?' * len(columns)))
+					self.connection.executemany(insert, ((run_id,) + row for row in rows))
+					continue
+				# The snp rows are given their rowid explicitly so that the gene rows can refer to them without inserting one row at a time.
+				first_id = self.connection.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM snp").fetchone()[0]
+				insert = "INSERT INTO snp (rowid, run_id, {}) VALUES (?, ?, {})".format(", ".join(map(quote, columns)), ", ".join('?' * len(columns)))
+				self.connection.executemany(insert, ((snp_id, run_id) + row for snp_id, row in enumerate(rows, first_id)))
+				genes = values.get('gene', [None] * len(table))
+				self.connection.executemany(
+					"INSERT INTO snp_gene (snp_id, gene) VALUES (?, ?)",
+					((snp_id, i) for snp_id, gene in enumerate(genes, first_id) for i in split_genes(gene))
+				)
+		return run_id
+
+	def add_breseq(self, breseq: breseq_parser.Breseq) -> int:
+		""" Loads the tables of a parsed `Breseq` directory."""
+		return self.add_tables(breseq.builders, breseq.data_folder)
+
+	def query(self, sql: str, parameters: Sequence[Any] = ()) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+		""" Runs a query and returns the column names and the rows."""
+		cursor = self.connection.execute(sql, parameters)
+		return [column[0] for column in cursor.description or []], cursor.fetchall()
+
+	def gene(self, name: str) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+		""" The snp rows of every sample with a mutation in or next to the gene. Gene names are not case sensitive."""
+		return self.query("SELECT snp.* FROM snp_gene JOIN snp ON snp.rowid = snp_gene.snp_id WHERE snp_gene.gene = ? ORDER BY Sample, \"seq id\", position", (name,))
+
+	def region(self, seq_id: str, start: int, end: int, table: str = 'snp') -> Tuple[List[str], List[Tuple[Any, ...]]]:
+		""" The snp rows between `start` and `end` (inclusive) on `seq_id`, or the coverage rows that overlap that region."""
+		if table == 'coverage':
+			# Missing coverage regions start before the region ends, so the (seq id, start) index still narrows the search.
+			return self.query(
+				"SELECT * FROM coverage WHERE \"seq id\" = ? AND start <= ? AND \"end\" >= ? ORDER BY start, Sample", (seq_id, end, start)
+			)
+		return self.query("SELECT * FROM snp WHERE \"seq id\" = ? AND position BETWEEN ? AND ? ORDER BY position, Sample", (seq_id, start, end))
+
+	def sample(self, name: str) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+		return self.query("SELECT * FROM snp WHERE Sample = ? ORDER BY \"seq id\", position", (name,))
+
+	def mutation_type(self, name: str) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+		return self.query("SELECT * FROM snp WHERE \"mutation type\" = ? ORDER BY \"seq id\", position, Sample", (name.upper(),))
+
+	def samples(self) -> Tuple[List[str], List[Tuple[Any, ...]]]:
+		""" Every sample in the database and the run it was loaded by."""
+		return self.query(
+			"SELECT samples.sample, runs.run_id, runs.directory, runs.loaded, "
+			"(SELECT COUNT(*) FROM snp WHERE snp.Sample = samples.sample) AS mutations "
+			"FROM samples JOIN runs ON runs.run_id = samples.run_id ORDER BY samples.sample"
+		)
+
+
+def write_rows(columns: List[str], rows: List[Tuple[Any, ...]], output = sys.stdout, delimiter: str = '\t') -> None:
+	writer = csv.writer(output, delimiter = delimiter, lineterminator = '\n')
+	writer.writerow(columns)
+	writer.writerows(['' if value is None else value for value in row] for row in rows)
+
+
+def create_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(description = "Queries a database of breseq mutations made with `breseq_parser.py -f sqlite`.")
+	parser.add_argument("database", help = "The database file.", type = Path)
+	parser.add_argument("-d", "--delimiter", help = "Delimiter of the output. Defaults to tabs.", default = '\t', dest = 'delimiter')
+	subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+	gene_parser = subparsers.add_parser('gene', help = "Mutations in or next to a gene.")
+	gene_parser.add_argument("name", help = "The gene name.")
+
+	region_parser = subparsers.add_parser('region', help = "Mutations between two positions, inclusive.")
+	region_parser.add_argument("seq_id", help = "The reference sequence.")
+	region_parser.add_argument("start", type = int)
+	region_parser.add_argument("end", type = int)
+	region_parser.add_argument("--coverage", help = "Show the missing coverage regions that overlap the region instead.", action = 'store_true')
+
+	sample_parser = subparsers.add_parser('sample', help = "Mutations of a single sample.")
+	sample_parser.add_argument("name", help = "The sample name.")
+
+	type_parser = subparsers.add_parser('type', help = "Mutations of a single type, such as SNP, DEL, INS, MOB or AMP.")
+	type_parser.add_argument("name", help = "The mutation type.")
+
+	subparsers.add_parser('samples', help = "The samples in the database.")
+
+	sql_parser = subparsers.add_parser('sql', help = "Run any SQL query.")
+	sql_parser.add_argument("query", help = "The query. Column names with spaces must be double quoted, as in \"seq id\".")
+	return parser
+
+
+def main(arguments: List[str] = None) -> int:
+	args = create_parser().parse_args(arguments)
+	if not args.database.exists():
+		print("The database does not exist: ", args.database, file = sys.stderr)
+		return 1
+	start = time.perf_counter()
+	with MutationDatabase(args.database) as database:
+		if args.command == 'gene':
+			columns, rows = database.gene(args.name)
+		elif args.command == 'region':
+			columns, rows = database.region(args.seq_id, args.start, args.end, 'coverage' if args.coverage else 'snp')
+		elif args.command == 'sample':
+			columns, rows = database.sample(args.name)
+		elif args.command == 'type':
+			columns, rows = database.mutation_type(args.name)
+		elif args.command == 'samples':
+			columns, rows = database.samples()
+		else:
+			columns, rows = database.query(args.query)
+	write_rows(columns, rows, delimiter = args.delimiter)
+	print("{} rows in {:.1f} ms".format(len(rows), (time.perf_counter() - start) * 1000), file = sys.stderr)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
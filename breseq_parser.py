@@ -1,467 +1,2298 @@
-#! /usr/bin/python
-# -*- coding: utf-8 -*-
-from openpyxl import load_workbook, styles
-from collections import OrderedDict
-from bs4 import BeautifulSoup
-import pandas
-from unidecode import unidecode
-import pathlib
-from typing import *
-import argparse
-import os
-from pprint import pprint
-from functools import partial
-
-print = partial(print, flush = True)
-Table = List[Dict[str, str]]
-# TODO expand user folder with ~ for the -d flag
-DEBUG = os.name == 'nt'
-
-if not DEBUG:
-	parser = argparse.ArgumentParser(
-		description = "This is a Breseq Mutation Parser.  It Currently outputs only SNPs, Missing Coverage, "
-					  "and New Junction Evidence (wont output junction repeats).  "
-					  "In order to run this program please put all the Breseq directores into a master directory and then "
-					  "parse that directory with the program's -d flag.")
-
-	parser.add_argument(
-		'-d', '--directory',
-		action = "store",
-		help = "Use this flag to indicate the folder with the samples you would like to parse. Each subfolder should have an index.html file.",
-		dest = "directory"
-	)
-	parser.add_argument(
-		'-f', '--format',
-		action = "store",
-		help = "format of the output file.",
-		dest = 'filetype',
-		choices = ['csv', 'tsv', 'xlsx'],
-		default = 'xlsx'
-	)
-	parser.add_argument(
-		'-o', '--output',
-		action = "store",
-		help = "Name of the output file (if in excel format) or folder. Should be a folder if outputting as text files. Defaults to './breseq_output'",
-		default = 'breseq_output',
-		dest = 'filename'
-	)
-
-	args = parser.parse_args()
-
-else:
-
-	class Parser:
-		directory: str
-		filetype: str
-		prefix: str
-
-		def __init__(self, a, b, c):
-			self.directory = a
-			self.filetype = b
-			self.filename = c
-
-
-	test_folder = pathlib.Path(__file__).parent / 'test_data'
-	args = Parser(test_folder, 'xlsx', test_folder.with_name('test_output.xlsx'))
-
-
-def toNumber(string: str) -> int:
-	""" Converts a string to a number"""
-	try:
-		string = int(string.replace(',', ''))
-	except ValueError:
-		pass
-	return string
-
-
-class Breseq:
-	"""
-		Parses a directory of breseq analysis folders.
-		Parameters
-		----------
-		options: Parser
-			Contains the command-line arguments passed to the program.
-	"""
-	def __init__(self, options):
-
-		self.options = options
-		self.data_folder = pathlib.Path(self.options.directory)
-		self.snp_table = list()
-		self.coverage_table = list()
-		self.junction_table = list()
-		for folder in self.data_folder.iterdir():
-			if not folder.is_dir(): continue
-			print("parsing ", folder)
-			snp_table, coverage_table, junction_table = self.parseAnalysisFolder(folder)
-
-			self.snp_table += snp_table
-			self.coverage_table += coverage_table
-			self.junction_table += junction_table
-
-		self.snp_table = pandas.DataFrame(self.snp_table)
-		self.coverage_table = pandas.DataFrame(self.coverage_table)
-		self.junction_table = pandas.DataFrame(self.junction_table)
-		self.generateComparisonTable(self.snp_table)
-
-	def parseAnalysisFolder(self, folder: pathlib.Path) -> Tuple[Table, Table, Table]:
-		"""
-
-		Parameters
-		----------
-		folder: pathlib.Path
-			Path to a single analysis folder generated by breseq.
-
-		Returns
-		-------
-			snp_table, coverage_table, junction_table
-
-		"""
-
-		if not (folder.is_file() and folder.exists()):
-
-			index_file = folder / "output" / "index.html"
-
-			if not index_file.exists():
-				index_file = folder / "index.html"
-				if not index_file.exists():
-					print("\tThe index.html file is missing. Ignoring folder.")
-					return [], [], []
-		else:
-			index_file = folder
-		print("\tIndex File: ", index_file)
-		sample_name = folder.name
-		snp_headers, snp_table, coverage_soup, junction_soup = self._parseIndexFile(index_file)
-		parsed_snp_table = self._parsePredictedMutations(sample_name, snp_headers, snp_table)
-		coverage_table = self._parseCoverage(sample_name, coverage_soup)
-		junction_table = self._parseJunctions(sample_name, junction_soup)
-		return parsed_snp_table, coverage_table, junction_table
-
-	@staticmethod
-	def _extractIndexFileTables(soup: BeautifulSoup) -> Tuple[List[str], BeautifulSoup, BeautifulSoup]:
-		"""
-			Extracts the headers for the snp table, the junction table, and the coverage table.
-		Parameters
-		----------
-		soup: BeautifulSoup
-			Equivilent to BeautifulSoup(index.html)
-
-		Returns
-		-------
-			snp_header, coverage_table, junction_table
-
-		"""
-		alph_soup = str(soup)
-		# print(alph_soup)
-		begin_snp_header_string = r'<th>evidence</th>'
-		# begin_snp_header_string = r'Predicted mutations</th></tr><tr>'
-		end_snp_header_string = '<!-- Item Lines -->'
-
-		begin_snp_header = alph_soup.find(begin_snp_header_string)
-		end_snp_header = alph_soup.find(end_snp_header_string)
-
-		snp_header_full = alph_soup[begin_snp_header:end_snp_header]
-		snp_header = snp_header_full[end_snp_header:]
-
-		snp_header_soup = BeautifulSoup(snp_header_full, 'lxml')
-		snp_header_soup = [i.text for i in snp_header_soup.find_all('th')]
-
-		if DEBUG and False:
-			print("Begin snp header index: ", begin_snp_header)
-			print("End snp header index: ", end_snp_header)
-			print()
-			print("_extractIndexFilesTables")
-			print("Full Header: ", type(snp_header_full))
-			print(snp_header_full)
-			print()
-			print("Short Header:", type(snp_header))
-			print(len(snp_header))
-			print(snp_header)
-			print()
-			print("BS4 Header:")
-			print(snp_header_soup)
-
-		begin_umc = alph_soup.find(
-			'<tr><th align="left" class="missing_coverage_header_row" colspan="11">Unassigned missing coverage evidence</th></tr>')
-		end_umc = alph_soup.find(
-			'<th align="left" class="new_junction_header_row" colspan="12">Unassigned new junction evidence</th>')
-		coverage_string = alph_soup[begin_umc:end_umc]
-		junction_string = alph_soup[end_umc:]
-		coverage_soup = BeautifulSoup(coverage_string, 'lxml')
-		junction_soup = BeautifulSoup(junction_string, 'lxml')
-		return snp_header_soup, coverage_soup, junction_soup
-
-	def _parseIndexFile(self, filename: pathlib.Path)->Tuple[List[str], BeautifulSoup,BeautifulSoup,BeautifulSoup]:
-		"""
-			Extracts the relevant tables from the index table.
-		Parameters
-		----------
-		filename: pathlib.Path
-			The path to the index file for a single output folder.
-
-		Returns
-		-------
-			snp_header, snp_table, coverage_soup, junction_soup
-		"""
-		with open(filename, 'r') as file1:
-			contents = file1.read()
-
-		soup = BeautifulSoup(contents, 'lxml')
-
-		normal_table = soup.find_all(attrs = {'class': 'normal_table_row'})
-		poly_table = soup.find_all(attrs = {'class': 'polymorphism_table_row'})
-		if len(normal_table):
-			snp_table = normal_table
-		else:
-			snp_table = poly_table
-		snp_table = normal_table + poly_table
-		snp_header_soup, coverage_soup, junction_soup = self._extractIndexFileTables(soup)
-
-		return snp_header_soup, snp_table, coverage_soup, junction_soup
-
-	@staticmethod
-	def _parsePredictedMutations(sample_name: str, headers: List[str], rows: List) -> Table:
-		"""
-			Parses the SNP table.
-		Parameters
-		----------
-		sample_name: str
-			The name of the sample. Usually extracted from the name of the analysis folder.
-		headers: List[str]
-			Column names for the snp table.
-		rows: List
-			The rows of the snp table.
-
-		Returns
-		-------
-
-		"""
-		converted_table = list()
-
-		for tag in rows:
-			values = [v.text for v in tag.find_all('td')]
-
-			if len(values) > 1:
-				row = {k: v for k, v in zip(headers, values)}
-				row['Sample'] = sample_name
-				try:
-					row['position'] = toNumber(row['position'])
-				except KeyError:
-					row['position'] = None
-				try:
-					row['freq %'] = float(row['freq'][:-1])
-					row.pop('freq')
-				except KeyError:
-					pass
-				converted_table.append(row)
-		return converted_table
-
-	@staticmethod
-	def _parseCoverage(sample_name: str, coverage: BeautifulSoup) -> Table:
-		coverage_table = list()
-		rows = coverage.find_all('tr')
-		if len(rows) == 0:
-			print("\tCould not parse the coverage table.")
-			return coverage_table
-		column_names = [i.text for i in rows[1].find_all('th')]
-
-		for index, tag in enumerate(rows[2:]):
-			values = tag.find_all('td')
-
-			if len(values) > 1:
-				row = [('Sample', sample_name)] + [(k, v.get_text()) for k, v in zip(column_names, values)]
-				row = OrderedDict(row)
-
-				row['start'] = toNumber(row['start'])
-				row['end'] = toNumber(row['end'])
-				row['size'] = toNumber(row['size'])
-				coverage_table.append(row)
-
-		return coverage_table
-
-	@staticmethod
-	def _parseJunctions(sample_name: str, junctions: BeautifulSoup) -> Table:
-		rows = junctions.find_all('tr')
-		if len(rows) == 0:
-			print("\tCould not parse Junctino table.")
-			return list()
-		column_names_a = ['0', '1'] + [unidecode(i.get_text()) for i in rows.pop(0).find_all('th')][1:]
-
-		column_names_a[4] = '{} ({})'.format(column_names_a[4], 'single')
-		column_names_b = [i for i in column_names_a if i not in ['reads (cov)', 'score', 'skew', 'freq', '0']]
-		junction_table = list()
-		for a_row, b_row in zip(rows[::2], rows[1::2]):
-			a_values = [unidecode(i.get_text()) for i in a_row.find_all('td')]
-			b_values = [unidecode(i.get_text()) for i in b_row.find_all('td')]
-
-			a_row = {unidecode(k): v for k, v in zip(column_names_a, a_values)}
-			b_row = {unidecode(k): v for k, v in zip(column_names_b, b_values)}
-			a_row['Sample'] = sample_name
-			b_row['Sample'] = sample_name
-			junction_table.append(a_row)
-			junction_table.append(b_row)
-		return junction_table
-
-	@staticmethod
-	def generateComparisonTable(snp_table: pandas.DataFrame) -> Optional[pandas.DataFrame]:
-		# Sample	annotation	description	evidence	gene	mutation	position	seq id
-		try:
-			all_samples = set(snp_table['Sample'].values)
-			columns = [unidecode(i) for i in snp_table.columns.values]
-
-			sequence_group = snp_table.groupby(by = ['seq id', 'position'])
-			comparison = list()
-			for element, sequence in sequence_group:
-				seq_id, position = element
-				samples = sequence['Sample'].values
-
-				char = 'X' if len(samples) == 1 else '.'
-
-				comparison_row = {k: char for k in samples}
-				comparison_row['seq id'] = seq_id
-				comparison_row['position'] = position
-				comparison_row['all'] = '.' if len(samples) == len(all_samples) else ''
-				comparison.append(comparison_row)
-
-			comparison_table = pandas.DataFrame(comparison)
-		except:
-			comparison_table = None
-		return comparison_table
-
-	def _formatComparisonWorksheet(self, worksheet):
-
-		for character in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
-			for index in range(1, len(self.snp_table)):
-				cell_index = character + str(index)
-				cell = worksheet[cell_index]
-				print(cell)
-				value = cell.value
-				if value == '.':
-
-					cell.fill = styles.Fill(bgColor = styles.Color('00000000'), fill_type = 'solid')
-				elif value == 'X':
-
-					cell.fill = styles.PatternFill(bgColor = styles.Color('12345678'), fill_type = 'solid')
-
-		return worksheet
-
-	def save(self, filename = None, filetype = None)->None:
-		"""
-			Saves the parsed tables to a file.
-		Parameters
-		----------
-		filename: str
-			The name of the output file.
-		filetype: {'xlsx', 'tsv', 'csv'}
-			The format of the output file.
-
-		Returns
-		-------
-
-		"""
-		if filetype is None:
-			filetype = args.filetype
-		filetype = filetype.lower()
-
-		if filename is None:
-			filename = args.filename
-		filename = pathlib.Path(filename)
-		if filename.is_dir():
-			filename = filename / 'breseq_output'
-
-		print("Saving to ", filename)
-
-		if filetype == 'xlsx':
-			self.to_excel(filename)
-		else:
-			self.to_csv(filename, filetype)
-
-	def to_excel(self, filename:Union[str,pathlib.Path]):
-		"""
-			Saves the parsed table as an Excel spreadsheet.
-		Parameters
-		----------
-		filename: str, pathlib.Path
-			The output file.
-
-		Returns
-		-------
-
-		"""
-		if isinstance(filename, str):
-			filename = pathlib.Path(filename)
-		filename = filename.with_suffix('.xlsx')
-		writer = pandas.ExcelWriter(filename)
-		include_index = False
-
-		self.snp_table.to_excel(writer, 'snps', index = include_index)
-
-		self.coverage_table.to_excel(writer, 'coverage', index = include_index)
-
-		self.junction_table.to_excel(writer, 'junctions', index = include_index)
-		try:
-			comparison_table = self.generateComparisonTable(self.snp_table)
-		except KeyError:
-			comparison_table = None
-		if comparison_table is not None:
-			comparison_table.to_excel(writer, 'snp comparison', index = include_index)
-
-		writer.close()
-
-		wb = load_workbook(filename)
-		# cws = wb.get_sheet_by_name('snp comparison')
-		# cws = self._formatComparisonWorksheet(cws)
-		ws = wb.get_sheet_by_name('junctions')
-
-		merge_columns = [
-			c
-			for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
-			if ws[c + '1'].value in ['Sample', 0, '0', 'freq', 'product', 'score']
-		]
-
-		for x in range(0, len(self.junction_table), 2):
-			for column in merge_columns:
-				cells_to_merge = '{0}{1}:{0}{2}'.format(column, x + 2, x + 3)
-				ws.merge_cells(cells_to_merge)
-
-		wb.save(filename)
-
-	def to_csv(self, folder: Union[str, pathlib.Path], filetype):
-		"""
-			Saves the parsed tables as csv/tsv files.
-		Parameters
-		----------
-		folder: Union[str,pathlib.Path]
-
-		filetype: {'csv', 'tsv'}
-
-		Returns
-		-------
-
-		"""
-		if isinstance(folder, str):
-			folder = pathlib.Path(folder)
-		extension = 'tsv' if filetype == 'tsv' else 'csv'
-		snp_filename = str(folder.with_name(folder.stem + '.snp.' + extension).absolute())
-		coverage_filename = str(folder.with_name(folder.stem + '.coverage.' + extension).absolute())
-		junction_filename = str(folder.with_name(folder.stem + '.junction.' + extension).absolute())
-
-		delimiter = '\t' if filetype == 'tsv' else ','
-		include_index = False
-
-		self.snp_table.to_csv(snp_filename, sep = delimiter, index = include_index)
-		self.coverage_table.to_csv(coverage_filename, sep = delimiter, index = include_index)
-		self.junction_table.to_csv(junction_filename, sep = delimiter, index = include_index)
-
-	def to_vcf(self):
-		raise NotImplementedError
-
-if __name__ == "__main__":
-	data_folder = args.directory
-	output_file = pathlib.Path(args.filename)
-	if not data_folder or not pathlib.Path(data_folder).is_dir():
-		print("This is not a valid folder: ", data_folder)
-		print("Please Enter a valid Directory to parse, try the --help flag if you have questions, exiting!")
-		exit(1)
-
-	obj = Breseq(args)
-	obj.save(args.filename, args.filetype)
+#! /usr/bin/python
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+import pathlib
+from typing import *
+import argparse
+from array import array
+from collections import Counter, deque
+import csv
+import importlib
+import os
+import re
+import hashlib
+import itertools
+import math
+import sys
+import time
+import html
+import json
+from contextlib import contextmanager
+from functools import cached_property, partial
+from html.parser import HTMLParser
+
+try:
+	import resource
+except ImportError:
+	# Not available on Windows.
+	resource = None
+
+
+class _LazyModule:
+	"""
+		Stands in for a module until one of its attributes is used, and only then imports it.
+		numpy, pandas, openpyxl and unidecode take most of the startup time, and many runs only need some of them.
+	Parameters
+	----------
+	name: str
+		The name of the module to import.
+	"""
+	def __init__(self, name: str):
+		self._name = name
+		self._module = None
+
+	def __getattr__(self, attribute: str) -> Any:
+		if self._module is None:
+			self._module = importlib.import_module(self._name)
+		return getattr(self._module, attribute)
+
+
+numpy = _LazyModule('numpy')
+pandas = _LazyModule('pandas')
+
+print = partial(print, flush = True)
+# The text of the header (th) and data (td) cells of a single table row.
+TableRow = Tuple[List[str], List[str]]
+# TODO expand user folder with ~ for the -d flag
+DEBUG = os.name == 'nt'
+# Increment whenever a change to the parser changes the parsed tables. Invalidates any cached results.
+PARSER_VERSION = 2
+CACHE_FOLDER_NAME = '.breseq_parser_cache'
+# The column types used when the tables are saved in a columnar format. Other columns are stored as strings.
+COLUMNAR_SCHEMA = {
+	'snp':        {
+		'Sample': 'category', 'seq id': 'category', 'evidence': 'category', 'mutation type': 'category', 'gene': 'category',
+		'position': 'Int64', 'freq %': 'float64'
+	},
+	'coverage':   {'Sample': 'category', 'seq id': 'category', 'gene': 'category', 'start': 'Int64', 'end': 'Int64', 'size': 'Int64'},
+	'junction':   {'Sample': 'category', 'seq id': 'category', 'gene': 'category'},
+	'comparison': {'Sample': 'category', 'seq id': 'category', 'position': 'Int64', 'marker': 'category'}
+}
+
+
+def create_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(
+		description = "This is a Breseq Mutation Parser.  It Currently outputs only SNPs, Missing Coverage, "
+					  "and New Junction Evidence (wont output junction repeats).  "
+					  "In order to run this program please put all the Breseq directores into a master directory and then "
+					  "parse that directory with the program's -d flag.")
+
+	parser.add_argument(
+		'-d', '--directory',
+		action = "store",
+		help = "Use this flag to indicate the folder with the samples you would like to parse. Each subfolder should have an output/output.gd or index.html file.",
+		dest = "directory"
+	)
+	parser.add_argument(
+		'-f', '--format',
+		action = "store",
+		help = "format of the output file.",
+		dest = 'filetype',
+		choices = ['csv', 'tsv', 'xlsx', 'parquet', 'vcf', 'sqlite'],
+		default = 'xlsx'
+	)
+	parser.add_argument(
+		'-o', '--output',
+		action = "store",
+		help = "Name of the output file (if in excel, vcf or sqlite format) or folder. Should be a folder if outputting as text or parquet files. Defaults to './breseq_output'",
+		default = 'breseq_output',
+		dest = 'filename'
+	)
+	parser.add_argument(
+		'-j', '--jobs',
+		action = "store",
+		help = "Number of analysis folders to parse in parallel. Defaults to 1.",
+		dest = 'jobs',
+		type = int,
+		default = 1
+	)
+	parser.add_argument(
+		'--no-cache',
+		action = "store_false",
+		help = "Parse every sample again without reading or writing the result cache.",
+		dest = 'use_cache'
+	)
+	parser.add_argument(
+		'--rebuild-cache',
+		action = "store_true",
+		help = "Ignore any cached results, parse every sample again and overwrite the cache.",
+		dest = 'rebuild_cache'
+	)
+	parser.add_argument(
+		'--profile',
+		action = "store_true",
+		help = "Measure the time and memory used by each phase and each sample, and print a summary when finished.",
+		dest = 'profile'
+	)
+	parser.add_argument(
+		'--profile-output',
+		action = "store",
+		help = "Save the profile measurements to this file as JSON lines. Implies --profile.",
+		dest = 'profile_output'
+	)
+	parser.add_argument(
+		'--stream',
+		action = "store_true",
+		help = "Save each sample as soon as it is parsed instead of keeping every sample in memory. "
+			   "The output is a folder of per-sample tsv files and a comparison table, as with --watch.",
+		dest = 'stream'
+	)
+	parser.add_argument(
+		'--watch',
+		action = "store_true",
+		help = "Keep polling the directory and add each analysis folder to the output folder once breseq has finished with it. "
+			   "The output is a folder of per-sample tsv files and a comparison table that is updated as samples are added.",
+		dest = 'watch'
+	)
+	parser.add_argument(
+		'--once',
+		action = "store_true",
+		help = "With --watch, check the directory a single time instead of polling.",
+		dest = 'once'
+	)
+	parser.add_argument(
+		'--interval',
+		action = "store",
+		help = "With --watch, the number of seconds between polls. Defaults to 60.",
+		dest = 'interval',
+		type = float,
+		default = 60
+	)
+	parser.add_argument(
+		'--settle',
+		action = "store",
+		help = "With --watch, the number of seconds an output.gd or index.html file must be unchanged before it is parsed. Defaults to 120.",
+		dest = 'settle',
+		type = float,
+		default = 120
+	)
+	return parser
+
+
+class Parser:
+	directory: str
+	filetype: str
+	prefix: str
+
+	def __init__(self, a, b, c):
+		self.directory = a
+		self.filetype = b
+		self.filename = c
+		self.jobs = 1
+		self.use_cache = True
+		self.rebuild_cache = False
+		self.profile = False
+		self.profile_output = None
+		self.watch = False
+		self.stream = False
+
+
+# The positional fields that follow the type, id and parent ids of each GenomeDiff record.
+GENOMEDIFF_MUTATION_FIELDS = {
+	'SNP': ['seq_id', 'position', 'new_seq'],
+	'SUB': ['seq_id', 'position', 'size', 'new_seq'],
+	'DEL': ['seq_id', 'position', 'size'],
+	'INS': ['seq_id', 'position', 'new_seq'],
+	'MOB': ['seq_id', 'position', 'repeat_name', 'strand', 'duplication_size'],
+	'AMP': ['seq_id', 'position', 'size', 'new_copy_number'],
+	'CON': ['seq_id', 'position', 'size', 'region'],
+	'INV': ['seq_id', 'position', 'size']
+}
+GENOMEDIFF_EVIDENCE_FIELDS = {
+	'RA': ['seq_id', 'position', 'insert_position', 'ref_base', 'new_base'],
+	'MC': ['seq_id', 'start', 'end', 'start_range', 'end_range'],
+	'JC': ['side_1_seq_id', 'side_1_position', 'side_1_strand', 'side_2_seq_id', 'side_2_position', 'side_2_strand', 'overlap'],
+	'UN': ['seq_id', 'start', 'end']
+}
+
+
+def iterGenomeDiff(filename: pathlib.Path) -> Iterator[Dict[str, Any]]:
+	"""
+		Reads a GenomeDiff file one line at a time.
+	Parameters
+	----------
+	filename: pathlib.Path
+		A GenomeDiff file, usually output/output.gd.
+
+	Yields
+	-------
+		A dict with the 'type', 'id' and 'parents' of each mutation or evidence record, its positional fields and its key=value pairs.
+		Validation records and other types are skipped.
+	"""
+	with open(filename, 'r') as file1:
+		for line in file1:
+			line = line.rstrip('\r\n')
+			if not line or line.startswith('#'):
+				continue
+			values = line.split('\t')
+			record_type = values[0]
+			fields = GENOMEDIFF_MUTATION_FIELDS.get(record_type, GENOMEDIFF_EVIDENCE_FIELDS.get(record_type))
+			if fields is None:
+				continue
+			parents = [] if values[2] in ('', '.') else values[2].split(',')
+			record = {'type': record_type, 'id': values[1], 'parents': parents}
+			record.update(zip(fields, values[3:3 + len(fields)]))
+			for item in values[3 + len(fields):]:
+				key, _, value = item.partition('=')
+				record[key] = value
+			yield record
+
+
+def _stripHtml(string: str) -> str:
+	""" Removes the markup from the html_* values of an annotated GenomeDiff file."""
+	return html.unescape(re.sub(r'<[^>]+>', '', string))
+
+
+def _formatGenomeDiffMutation(mutation: Dict[str, Any], parents: List[Dict[str, Any]]) -> str:
+	""" Formats a mutation the same way as the 'mutation' column of index.html."""
+	if 'html_mutation' in mutation:
+		return _stripHtml(mutation['html_mutation'])
+	mutation_type = mutation['type']
+	if mutation_type == 'SNP':
+		reference = mutation.get('ref_seq', next((parent['ref_base'] for parent in parents if parent['type'] == 'RA'), ''))
+		return "{}→{}".format(reference, mutation['new_seq'])
+	elif mutation_type == 'SUB':
+		return "{} bp→{}".format(mutation['size'], mutation['new_seq'])
+	elif mutation_type == 'DEL':
+		return "Δ{:,} bp".format(int(mutation['size']))
+	elif mutation_type == 'INS':
+		return "+{}".format(mutation['new_seq'])
+	elif mutation_type == 'MOB':
+		strand = '+' if mutation['strand'] == '1' else '–'
+		return "{} ({}) +{} bp".format(mutation['repeat_name'], strand, mutation['duplication_size'])
+	elif mutation_type == 'AMP':
+		return "{:,} bp x {}".format(int(mutation['size']), mutation['new_copy_number'])
+	elif mutation_type == 'CON':
+		return "{:,} bp→{}".format(int(mutation['size']), mutation['region'])
+	else:
+		return "{:,} bp inversion".format(int(mutation['size']))
+
+
+def _formatGenomeDiffAnnotation(mutation: Dict[str, Any]) -> str:
+	""" Formats the annotation of a mutation the same way as the 'annotation' column of index.html."""
+	if mutation.get('snp_type') in ('synonymous', 'nonsynonymous', 'nonsense') and 'aa_position' in mutation:
+		return "{}{}{} ({}→{})".format(
+			mutation.get('aa_ref_seq', ''), mutation['aa_position'], mutation.get('aa_new_seq', ''),
+			mutation.get('codon_ref_seq', ''), mutation.get('codon_new_seq', '')
+		)
+	return mutation.get('gene_position', '')
+
+
+# The known columns of each table and the type they are stored as. See TableBuilder.
+SNP_SCHEMA = {
+	'Sample':      'category',
+	'evidence':    'category',
+	'seq id':      'category',
+	'position':    'int',
+	'mutation':    'str',
+	'freq %':      'float',
+	'annotation':  'str',
+	'gene':        'str',
+	'description': 'str'
+}
+COVERAGE_SCHEMA = {
+	'Sample':      'category',
+	'seq id':      'category',
+	'start':       'int',
+	'end':         'int',
+	'size':        'int',
+	'←cov':        'str',
+	'cov→':        'str',
+	'gene':        'str',
+	'description': 'str'
+}
+JUNCTION_SCHEMA = {
+	'Sample':               'category',
+	'0':                    'str',
+	'1':                    'str',
+	'seq id':               'category',
+	'position':             'str',
+	'reads (cov) (single)': 'str',
+	'reads (cov)':          'str',
+	'score':                'str',
+	'skew':                 'str',
+	'freq':                 'str',
+	'annotation':           'str',
+	'gene':                 'str',
+	'product':              'str'
+}
+
+
+def mutationType(mutation: Optional[str]) -> Optional[str]:
+	"""
+		Infers the GenomeDiff mutation type from the 'mutation' column of the snp table.
+	Parameters
+	----------
+	mutation: str
+		The mutation as shown by breseq, such as 'C→T', 'Δ1,199 bp', '+GC', 'IS150 (–) +3 bp' or '(TTA)5→4'.
+
+	Returns
+	-------
+		One of 'SNP', 'SUB', 'DEL', 'INS', 'MOB', 'AMP', 'CON' or 'INV', or `None` if the type is not recognized.
+	"""
+	if not mutation:
+		return None
+	mutation = mutation.strip()
+	if re.fullmatch(r"[ACGTN]→[ACGTN]", mutation):
+		return 'SNP'
+	if mutation.startswith('Δ'):
+		return 'DEL'
+	if mutation.startswith('+'):
+		return 'INS'
+	repeat = re.fullmatch(r"\(\w+\)(\d+)→(\d+)", mutation)
+	if repeat:
+		return 'INS' if int(repeat.group(2)) > int(repeat.group(1)) else 'DEL'
+	if re.match(r"\S+ \([+–-]\)", mutation):
+		return 'MOB'
+	if re.search(r"bp x \d", mutation):
+		return 'AMP'
+	if 'inversion' in mutation:
+		return 'INV'
+	replacement = re.fullmatch(r"[\d,]+ bp→(\S+)", mutation)
+	if replacement:
+		return 'SUB' if re.fullmatch(r"[ACGTN]+", replacement.group(1)) else 'CON'
+	return None
+
+
+class _StringColumn:
+	""" Stores text values. Missing values are `None`."""
+	def __init__(self, length: int = 0):
+		self.values = [None] * length
+
+	def __len__(self) -> int:
+		return len(self.values)
+
+	def append(self, value: Any) -> bool:
+		self.values.append(None if value is None else str(value))
+		return True
+
+	def appendMissing(self, count: int = 1):
+		self.values.extend([None] * count)
+
+	def pop(self):
+		self.values.pop()
+
+	def extend(self, other: '_StringColumn'):
+		self.values.extend(other.values)
+
+	def toList(self) -> List[Any]:
+		return self.values
+
+	def toArray(self) -> Any:
+		return self.values
+
+
+class _CategoryColumn:
+	""" Stores text values as integer codes into a list of categories. Missing values have the code -1."""
+	def __init__(self, length: int = 0):
+		self.codes = array('i', [-1]) * length
+		self.categories = dict()
+
+	def __len__(self) -> int:
+		return len(self.codes)
+
+	def append(self, value: Any) -> bool:
+		if value is None:
+			self.codes.append(-1)
+			return True
+		value = str(value)
+		code = self.categories.get(value)
+		if code is None:
+			code = self.categories[value] = len(self.categories)
+		self.codes.append(code)
+		return True
+
+	def appendMissing(self, count: int = 1):
+		self.codes.extend(array('i', [-1]) * count)
+
+	def pop(self):
+		self.codes.pop()
+
+	def extend(self, other: '_CategoryColumn'):
+		mapping = [self.categories.setdefault(value, len(self.categories)) for value in other.categories] + [-1]
+		# A code of -1 indexes the last element of `mapping`, so missing values stay missing.
+		self.codes.extend(array('i', map(mapping.__getitem__, other.codes)))
+
+	def toList(self) -> List[Any]:
+		categories = list(self.categories)
+		return [categories[code] if code >= 0 else None for code in self.codes]
+
+	def toArray(self) -> Any:
+		return pandas.Categorical.from_codes(numpy.frombuffer(self.codes, dtype = numpy.int32), categories = list(self.categories))
+
+
+class _IntegerColumn:
+	""" Stores 64-bit integers with a separate mask of missing values."""
+	def __init__(self, length: int = 0):
+		self.values = array('q', [0]) * length
+		self.missing = bytearray(b'\x01') * length
+
+	def __len__(self) -> int:
+		return len(self.values)
+
+	def append(self, value: Any) -> bool:
+		if isinstance(value, str):
+			value = value.strip().replace(',', '')
+			if not value:
+				value = None
+			else:
+				try:
+					value = int(value)
+				except ValueError:
+					self.appendMissing()
+					return False
+		elif isinstance(value, float):
+			if value != value:
+				value = None
+			elif not value.is_integer():
+				self.appendMissing()
+				return False
+			else:
+				value = int(value)
+		if value is None:
+			self.appendMissing()
+		else:
+			self.values.append(value)
+			self.missing.append(0)
+		return True
+
+	def appendMissing(self, count: int = 1):
+		self.values.extend(array('q', [0]) * count)
+		self.missing.extend(b'\x01' * count)
+
+	def pop(self):
+		self.values.pop()
+		self.missing.pop()
+
+	def extend(self, other: '_IntegerColumn'):
+		self.values.extend(other.values)
+		self.missing.extend(other.missing)
+
+	def toList(self) -> List[Any]:
+		return [None if missing else value for value, missing in zip(self.values, self.missing)]
+
+	def toArray(self) -> Any:
+		values = numpy.frombuffer(self.values, dtype = numpy.int64).copy()
+		mask = numpy.frombuffer(self.missing, dtype = numpy.uint8).astype(bool)
+		return pandas.arrays.IntegerArray(values, mask)
+
+
+class _FloatColumn:
+	""" Stores 64-bit floats. Missing values are NaN."""
+	def __init__(self, length: int = 0):
+		self.values = array('d', [math.nan]) * length
+
+	def __len__(self) -> int:
+		return len(self.values)
+
+	def append(self, value: Any) -> bool:
+		if isinstance(value, str):
+			value = value.strip().replace(',', '')
+			if not value:
+				value = None
+		if value is None:
+			self.appendMissing()
+			return True
+		try:
+			self.values.append(float(value))
+		except ValueError:
+			self.appendMissing()
+			return False
+		return True
+
+	def appendMissing(self, count: int = 1):
+		self.values.extend(array('d', [math.nan]) * count)
+
+	def pop(self):
+		self.values.pop()
+
+	def extend(self, other: '_FloatColumn'):
+		self.values.extend(other.values)
+
+	def toList(self) -> List[Any]:
+		return [None if value != value else value for value in self.values]
+
+	def toArray(self) -> Any:
+		return numpy.frombuffer(self.values, dtype = numpy.float64).copy()
+
+
+COLUMN_TYPES = {
+	'str':      _StringColumn,
+	'category': _CategoryColumn,
+	'int':      _IntegerColumn,
+	'float':    _FloatColumn
+}
+
+
+class TableBuilder:
+	"""
+		Accumulates the rows of a table as typed column arrays rather than as one dict per row.
+	Parameters
+	----------
+	schema: Dict[str, str]
+		The type of each known column: 'category', 'int', 'float' or 'str'. Columns that are not in the schema are
+		stored as strings. The known columns come first in the table, in the order of the schema.
+
+	Attributes
+	----------
+	failures: List[Tuple[str, str]]
+		The (column, value) pairs that could not be converted to the type of the column.
+		These cells are missing values in the table rather than strings in a numeric column.
+	"""
+	def __init__(self, schema: Dict[str, str]):
+		self.schema = schema
+		self.length = 0
+		self.failures = list()
+		self._columns = dict()
+
+	def __len__(self) -> int:
+		return self.length
+
+	def _column(self, name: str):
+		column = self._columns.get(name)
+		if column is None:
+			column = self._columns[name] = COLUMN_TYPES[self.schema.get(name, 'str')](self.length)
+		return column
+
+	def append(self, row: Iterable[Tuple[str, Any]]) -> None:
+		"""
+			Adds a row to the table.
+		Parameters
+		----------
+		row: Iterable[Tuple[str, Any]]
+			The (column, value) pairs of the row. Columns that are not given are missing values.
+			If a column is given more than once the last value is used.
+		"""
+		for name, value in row:
+			column = self._column(name)
+			if len(column) > self.length:
+				column.pop()
+			if not column.append(value):
+				self.failures.append((name, value))
+		self.length += 1
+		for column in self._columns.values():
+			if len(column) < self.length:
+				column.appendMissing()
+
+	def extend(self, other: 'TableBuilder') -> None:
+		""" Adds the rows of another table to the end of this table."""
+		for name, other_column in other._columns.items():
+			self._column(name).extend(other_column)
+		self.length += other.length
+		for column in self._columns.values():
+			if len(column) < self.length:
+				column.appendMissing(self.length - len(column))
+		self.failures += other.failures
+
+	def columns(self) -> List[str]:
+		""" The columns of the table, in the order they are saved in."""
+		return [i for i in self.schema if i in self._columns] + [i for i in self._columns if i not in self.schema]
+
+	def toDataFrame(self) -> pandas.DataFrame:
+		""" Builds the table directly from the column arrays."""
+		return pandas.DataFrame({name: self._columns[name].toArray() for name in self.columns()}, index = pandas.RangeIndex(self.length))
+
+	def values(self, name: str) -> List[Any]:
+		""" The values of a single column. Every value is missing if the table does not have the column."""
+		column = self._columns.get(name)
+		return [None] * self.length if column is None else column.toList()
+
+	def writeDelimited(self, filename: pathlib.Path, delimiter: str = '\t') -> None:
+		""" Saves the table as a delimited text file without building a DataFrame. Missing values are empty cells."""
+		columns = [self.values(name) for name in self.columns()]
+		with open(filename, 'w', newline = '') as file1:
+			writer = csv.writer(file1, delimiter = delimiter)
+			writer.writerow(self.columns())
+			for row in zip(*columns):
+				writer.writerow(['' if value is None else value for value in row])
+
+	def toDict(self) -> Dict[str, Any]:
+		""" Converts the table to plain lists, one per column, so it can be saved as json."""
+		return {
+			'length':   self.length,
+			'failures': self.failures,
+			'columns':  {name: self._columns[name].toList() for name in self.columns()}
+		}
+
+	@classmethod
+	def fromDict(cls, schema: Dict[str, str], data: Dict[str, Any]) -> 'TableBuilder':
+		""" Rebuilds a table saved with `toDict`."""
+		table = cls(schema)
+		table.length = data['length']
+		table.failures = [tuple(i) for i in data['failures']]
+		for name, values in data['columns'].items():
+			column = table._columns[name] = COLUMN_TYPES[schema.get(name, 'str')]()
+			for value in values:
+				column.append(value)
+		return table
+
+
+def _emptyTables() -> Tuple[TableBuilder, TableBuilder, TableBuilder]:
+	return TableBuilder(SNP_SCHEMA), TableBuilder(COVERAGE_SCHEMA), TableBuilder(JUNCTION_SCHEMA)
+
+
+def _normalizeHeader(name: str) -> str:
+	""" Collapses the non-breaking spaces and line breaks of an html column name into single spaces."""
+	return " ".join(name.split())
+
+
+class _SortedSites:
+	"""
+		A set of (seq id, position) sites sorted by seq id and position, so that the sites inside a region are a contiguous
+		slice found with a binary search. The seq ids are factorized once, however many samples are looked up.
+	"""
+	def __init__(self, seq_ids: Any, positions: Any):
+		codes, unique_seq_ids = pandas.factorize(pandas.Series(seq_ids, dtype = object))
+		positions = numpy.asarray(positions, dtype = numpy.int64)
+		self.order = numpy.lexsort((positions, codes))
+		self.positions = positions[self.order]
+		# The sites of each seq id, as the bounds of their slice of `order`. Missing seq ids have the code -1 and are sorted first.
+		boundaries = numpy.searchsorted(codes[self.order], numpy.arange(len(unique_seq_ids) + 1))
+		self.bounds: Dict[Any, Tuple[int, int]] = {
+			seq_id: (boundaries[code], boundaries[code + 1]) for code, seq_id in enumerate(unique_seq_ids)
+		}
+
+	def __len__(self) -> int:
+		return len(self.order)
+
+
+class CoverageIndex:
+	"""
+		The missing coverage regions of each sample, merged and sorted by start. Looking up a sample only searches the
+		sites of the seq ids it has regions on, with one binary search per region, rather than comparing every site to every region.
+	"""
+	def __init__(self):
+		# sample -> seq id -> (starts, ends) of the merged regions. Both ends are inclusive.
+		self._regions: Dict[str, Dict[str, Tuple[Any, Any]]] = dict()
+
+	def __len__(self) -> int:
+		return sum(len(starts) for sample_regions in self._regions.values() for starts, _ in sample_regions.values())
+
+	@classmethod
+	def fromTable(cls, coverage_table: TableBuilder) -> 'CoverageIndex':
+		""" Indexes the regions of a coverage table with the 'Sample', 'seq id', 'start' and 'end' columns."""
+		index = cls()
+		regions = dict()
+		columns = zip(coverage_table.values('Sample'), coverage_table.values('seq id'), coverage_table.values('start'), coverage_table.values('end'))
+		for sample_name, seq_id, start, end in columns:
+			regions.setdefault(sample_name, list()).append((seq_id, start, end))
+		for sample_name, sample_regions in regions.items():
+			index.add(sample_name, sample_regions)
+		return index
+
+	@staticmethod
+	def sortSites(seq_ids: Any, positions: Any) -> _SortedSites:
+		""" Prepares the (seq id, position) sites to look up with `missing`."""
+		return _SortedSites(seq_ids, positions)
+
+	def add(self, sample_name: str, regions: Iterable[Tuple[str, int, int]]) -> None:
+		""" Adds the (seq id, start, end) regions of a sample, replacing any regions previously added for it."""
+		by_seq_id = dict()
+		for seq_id, start, end in regions:
+			if seq_id is None or start is None or end is None:
+				continue
+			by_seq_id.setdefault(seq_id, list()).append((start, end))
+		self._regions[sample_name] = {
+			seq_id: self._merge(numpy.array(seq_regions, dtype = numpy.int64)) for seq_id, seq_regions in by_seq_id.items()
+		}
+
+	@staticmethod
+	def _merge(regions: Any) -> Tuple[Any, Any]:
+		""" Merges overlapping and adjacent regions so that the starts and the ends are both sorted."""
+		regions = regions[numpy.argsort(regions[:, 0], kind = 'stable')]
+		starts, ends = regions[:, 0], numpy.maximum.accumulate(regions[:, 1])
+		# A region starts a new merged region if it begins after every earlier region has ended.
+		first = numpy.concatenate([[True], starts[1:] > ends[:-1] + 1])
+		last = numpy.concatenate([first[1:], [True]])
+		return starts[first], ends[last]
+
+	def remove(self, sample_name: str) -> None:
+		self._regions.pop(sample_name, None)
+
+	def regions(self, sample_name: str) -> List[Tuple[str, int, int]]:
+		""" The merged regions of a sample."""
+		return [
+			(seq_id, int(start), int(end))
+			for seq_id, (starts, ends) in self._regions.get(sample_name, {}).items()
+			for start, end in zip(starts, ends)
+		]
+
+	def missing(self, sample_name: str, sites: _SortedSites) -> Any:
+		"""
+			Finds the sites that fall inside the missing coverage regions of a sample.
+		Parameters
+		----------
+		sample_name: str
+		sites: _SortedSites
+			The sites to check, from `sortSites`.
+
+		Returns
+		-------
+			The indices of the sites without coverage, in the order they were given to `sortSites`.
+		"""
+		found = list()
+		for seq_id, (starts, ends) in self._regions.get(sample_name, {}).items():
+			if seq_id not in sites.bounds:
+				continue
+			low, high = sites.bounds[seq_id]
+			positions = sites.positions[low:high]
+			# The regions are disjoint, so the sites inside each one are a separate slice of the sorted positions.
+			first = numpy.searchsorted(positions, starts, side = 'left')
+			last = numpy.searchsorted(positions, ends, side = 'right')
+			counts = last - first
+			total = counts.sum()
+			if total:
+				offsets = numpy.repeat(first - numpy.cumsum(counts) + counts, counts)
+				found.append(sites.order[low + offsets + numpy.arange(total)])
+		if not found:
+			return numpy.zeros(0, dtype = numpy.intp)
+		return numpy.concatenate(found)
+
+
+class ResultCache:
+	"""
+		Stores the parsed tables of each sample in a sidecar folder so that unchanged samples are not parsed again.
+		A cached result is only used if the parser version and the path, size, modification time and sha1 hash of the
+		source file (output.gd or index.html) all match the values recorded when the sample was parsed.
+	Parameters
+	----------
+	folder: pathlib.Path
+		The folder to keep the cache files in.
+	enabled: bool
+		Whether to read and write the cache at all.
+	rebuild: bool
+		Ignores any cached results but still writes the newly parsed tables to the cache.
+	"""
+	def __init__(self, folder: pathlib.Path, enabled: bool = True, rebuild: bool = False):
+		self.folder = folder
+		self.enabled = enabled
+		self.rebuild = rebuild
+
+	def _filename(self, sample_name: str) -> pathlib.Path:
+		return self.folder / (sample_name + '.json')
+
+	@staticmethod
+	def _hash(filename: pathlib.Path) -> str:
+		digest = hashlib.sha1()
+		with open(filename, 'rb') as file1:
+			for chunk in iter(partial(file1.read, 1 << 20), b''):
+				digest.update(chunk)
+		return digest.hexdigest()
+
+	@staticmethod
+	def _key(source: pathlib.Path) -> Dict[str, Any]:
+		stat = source.stat()
+		return {
+			'parser version': PARSER_VERSION,
+			'path':           str(source.absolute()),
+			'size':           stat.st_size,
+			'mtime':          stat.st_mtime_ns
+		}
+
+	def load(self, sample_name: str, source: pathlib.Path) -> Optional[Tuple[TableBuilder, TableBuilder, TableBuilder]]:
+		"""
+			Returns the cached tables for a sample, or `None` if there is no valid cached result.
+		Parameters
+		----------
+		sample_name: str
+		source: pathlib.Path
+			The file the sample's tables were parsed from.
+		"""
+		filename = self._filename(sample_name)
+		if not self.enabled or self.rebuild or not filename.exists():
+			return None
+		try:
+			with open(filename, 'r') as file1:
+				cached = json.load(file1)
+		except (OSError, ValueError):
+			return None
+		key = cached.get('key', {})
+		if any(key.get(k) != v for k, v in self._key(source).items()):
+			return None
+		if key.get('sha1') != self._hash(source):
+			return None
+		tables = cached['tables']
+		return (
+			TableBuilder.fromDict(SNP_SCHEMA, tables['snp']),
+			TableBuilder.fromDict(COVERAGE_SCHEMA, tables['coverage']),
+			TableBuilder.fromDict(JUNCTION_SCHEMA, tables['junction'])
+		)
+
+	def save(self, sample_name: str, source: pathlib.Path, tables: Tuple[TableBuilder, TableBuilder, TableBuilder]) -> None:
+		""" Writes the tables parsed from `source` to the cache."""
+		if not self.enabled: return
+		key = self._key(source)
+		key['sha1'] = self._hash(source)
+		snp_table, coverage_table, junction_table = tables
+		cached = {'key': key, 'tables': {'snp': snp_table.toDict(), 'coverage': coverage_table.toDict(), 'junction': junction_table.toDict()}}
+
+		filename = self._filename(sample_name)
+		temporary_filename = filename.with_suffix('.tmp')
+		try:
+			self.folder.mkdir(exist_ok = True)
+			with open(temporary_filename, 'w') as file1:
+				json.dump(cached, file1)
+			temporary_filename.replace(filename)
+		except OSError as exception:
+			print("\tCould not write the cache file {}: {}".format(filename, exception))
+
+
+class Profiler:
+	"""
+		Records the wall time, CPU time and memory use of each phase of a run, and of each sample.
+		When disabled, `phase` does nothing so the parser can always use it.
+	Parameters
+	----------
+	enabled: bool
+		Whether to record anything.
+	"""
+	# A sample is an outlier if its parse time is this many (scaled) median absolute deviations above the median...
+	OUTLIER_DEVIATIONS = 3.5
+	# ...and at least this many times the median, so that small differences between fast samples are ignored.
+	OUTLIER_RATIO = 2
+
+	def __init__(self, enabled: bool = True):
+		self.enabled = enabled
+		self.records: List[Dict[str, Any]] = list()
+
+	@staticmethod
+	def _memory() -> Tuple[Optional[float], Optional[float]]:
+		""" The current and the peak resident set size of this process, in megabytes. Either is `None` if it is not available on this platform."""
+		current = peak = None
+		try:
+			with open('/proc/self/statm') as file1:
+				current = int(file1.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+		except (OSError, ValueError, AttributeError):
+			pass
+		if resource is not None:
+			# ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+			peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+		return current, peak
+
+	@contextmanager
+	def phase(self, name: str, sample: str = None) -> Iterator[None]:
+		"""
+			Measures the code run inside the `with` block.
+		Parameters
+		----------
+		name: str
+			The name of the phase, such as 'parse' or 'save'.
+		sample: str
+			The sample the phase belongs to, if any.
+		"""
+		if not self.enabled:
+			yield
+			return
+		_, peak_before = self._memory()
+		wall_start, cpu_start = time.perf_counter(), time.process_time()
+		try:
+			yield
+		finally:
+			wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+			rss, peak = self._memory()
+			self.records.append({
+				'phase':            name,
+				'sample':           sample,
+				'wall':             wall,
+				'cpu':              cpu,
+				'rss_mb':           rss,
+				'peak_rss_mb':      peak,
+				# ru_maxrss never decreases, so this is only above zero when the phase raised the peak of the process.
+				'peak_rss_growth_mb': None if peak is None else peak - peak_before,
+				'pid':              os.getpid()
+			})
+
+	def extend(self, records: List[Dict[str, Any]]) -> None:
+		""" Adds the records of another profiler, such as one used by a worker process."""
+		if self.enabled:
+			self.records += records
+
+	def flagOutliers(self, phase: str = 'sample') -> List[Dict[str, Any]]:
+		"""
+			Marks the samples that took much longer than the others in `phase`. These usually point to pathological reports.
+		Returns
+		-------
+			The outlier records, which also have `'outlier': True`.
+		"""
+		records = [record for record in self.records if record['phase'] == phase and record['sample'] is not None]
+		if len(records) < 3:
+			return []
+		times = numpy.array([record['wall'] for record in records])
+		median = numpy.median(times)
+		# 1.4826 scales the median absolute deviation to the standard deviation of normally distributed values.
+		deviation = 1.4826 * numpy.median(numpy.abs(times - median))
+		cutoff = max(median + self.OUTLIER_DEVIATIONS * deviation, median * self.OUTLIER_RATIO)
+		outliers = list()
+		for record in records:
+			record['outlier'] = bool(record['wall'] > cutoff)
+			if record['outlier']:
+				outliers.append(record)
+		return outliers
+
+	def writeJsonLines(self, filename: Union[str, pathlib.Path]) -> None:
+		""" Saves one JSON object per record."""
+		with open(filename, 'w') as file1:
+			for record in self.records:
+				file1.write(json.dumps(record) + "\n")
+
+	def summary(self) -> pandas.DataFrame:
+		""" Totals the records of each phase, in the order the phases first ran."""
+		table = pandas.DataFrame(self.records)
+		if table.empty:
+			return table
+		return table.groupby('phase', sort = False).agg(
+			count = ('wall', 'size'),
+			wall = ('wall', 'sum'),
+			cpu = ('cpu', 'sum'),
+			max_wall = ('wall', 'max'),
+			peak_rss_mb = ('peak_rss_mb', 'max')
+		)
+
+	def report(self, filename: Union[str, pathlib.Path] = None) -> None:
+		""" Prints the summary table and the outlier samples, and saves the records as JSON lines if `filename` is given."""
+		if not self.enabled: return
+		outliers = self.flagOutliers()
+		print("Profile:")
+		print(self.summary().to_string(float_format = "{:.3f}".format))
+		if outliers:
+			median = numpy.median([record['wall'] for record in self.records if record['phase'] == 'sample'])
+			print("Samples that took much longer than the median ({:.3f} s) to parse:".format(median))
+			for record in sorted(outliers, key = lambda record: record['wall'], reverse = True):
+				print("\t{}: {:.3f} s".format(record['sample'], record['wall']))
+		if filename:
+			self.writeJsonLines(filename)
+			print("Saved the profile to ", filename)
+
+
+def _parseSample(folder: pathlib.Path, cache: Optional[ResultCache] = None, profile: bool = False) -> Tuple[str, Tuple[TableBuilder, TableBuilder, TableBuilder], Optional[str], List[Dict[str, Any]]]:
+	"""
+		Parses a single analysis folder. Defined at the module level so it can be sent to a process pool.
+	Parameters
+	----------
+	folder: pathlib.Path
+		Path to a single analysis folder generated by breseq.
+	cache: ResultCache
+		If given, the tables are loaded from the cache when the sample has not changed since it was last parsed.
+	profile: bool
+		Whether to measure each phase of parsing the sample.
+
+	Returns
+	-------
+		sample_name, (snp_table, coverage_table, junction_table), error, profile_records
+		The error is `None` if the folder was parsed successfully.
+	"""
+	profiler = Profiler(profile)
+	if cache is not None and not cache.enabled:
+		cache = None
+	try:
+		with profiler.phase('sample', folder.name):
+			source_file = Breseq.findSourceFile(folder)
+			tables = None
+			if cache is not None and source_file is not None:
+				with profiler.phase('cache load', folder.name):
+					tables = cache.load(folder.name, source_file)
+				if tables is not None:
+					print("loaded {} from the cache".format(folder))
+			if tables is None:
+				tables = Breseq.parseAnalysisFolder(folder, profiler)
+				if cache is not None and source_file is not None:
+					with profiler.phase('cache save', folder.name):
+						cache.save(folder.name, source_file, tables)
+		error = None
+	except Exception as exception:
+		tables = _emptyTables()
+		error = "{}: {}".format(type(exception).__name__, exception)
+	return folder.name, tables, error, profiler.records
+
+
+class IndexFileExtractor(HTMLParser):
+	"""
+		Walks a breseq index.html file once and collects the cell text of the predicted mutation,
+		missing coverage and new junction tables. The file can be fed in chunks, so the document is never held in memory.
+	Attributes
+	----------
+	snp_header: List[str]
+		The column names of the predicted mutation table.
+	snp_rows: List[List[str]]
+		The td values of each predicted mutation row. Consensus rows come before polymorphism rows.
+	coverage_rows: List[TableRow]
+		Every row after the 'Unassigned missing coverage evidence' title, up to the new junction table.
+	junction_rows: List[TableRow]
+		Every row after the 'Unassigned new junction evidence' title.
+	"""
+	def __init__(self):
+		super().__init__(convert_charrefs = True)
+		self.snp_header = list()
+		self.snp_rows = list()
+		self.coverage_rows = list()
+		self.junction_rows = list()
+
+		self._polymorphism_rows = list()
+		self._section = None
+		self._header_state = 'before'
+		self._row = None
+		self._cell = None
+
+	def handle_starttag(self, tag: str, attrs: List[Tuple[str, Optional[str]]]):
+		if tag == 'tr':
+			self._closeRow()
+			self._row = {'classes': self._classes(attrs), 'th': list(), 'td': list(), 'title': False}
+		elif tag in ('td', 'th'):
+			self._closeCell()
+			if tag == 'th':
+				classes = self._classes(attrs)
+				if 'missing_coverage_header_row' in classes:
+					self._startSection('coverage')
+				elif 'new_junction_header_row' in classes:
+					self._startSection('junction')
+			self._cell = (tag, list())
+
+	def handle_endtag(self, tag: str):
+		if tag in ('td', 'th'):
+			self._closeCell()
+		elif tag in ('tr', 'table'):
+			self._closeRow()
+
+	def handle_data(self, data: str):
+		if self._cell is not None:
+			self._cell[1].append(data)
+
+	def handle_comment(self, data: str):
+		if data.strip() == 'Item Lines' and self._header_state == 'open':
+			self._header_state = 'closed'
+
+	def close(self):
+		super().close()
+		self._closeRow()
+		self.snp_rows += self._polymorphism_rows
+		self._polymorphism_rows = list()
+
+	@staticmethod
+	def _classes(attrs: List[Tuple[str, Optional[str]]]) -> List[str]:
+		return next(((value or '').split() for name, value in attrs if name == 'class'), [])
+
+	def _startSection(self, section: str):
+		self._section = section
+		if self._row is not None:
+			self._row['title'] = True
+
+	def _closeCell(self):
+		if self._cell is None: return
+		tag, text = self._cell
+		text = "".join(text)
+		self._cell = None
+		if tag == 'th':
+			if self._header_state == 'before' and text == 'evidence':
+				self._header_state = 'open'
+			if self._header_state == 'open':
+				self.snp_header.append(text)
+		if self._row is not None:
+			self._row[tag].append(text)
+
+	def _closeRow(self):
+		self._closeCell()
+		row = self._row
+		if row is None: return
+		self._row = None
+
+		if 'normal_table_row' in row['classes']:
+			self.snp_rows.append(row['td'])
+		if 'polymorphism_table_row' in row['classes']:
+			self._polymorphism_rows.append(row['td'])
+		if row['title']:
+			return
+		if self._section == 'coverage':
+			self.coverage_rows.append((row['th'], row['td']))
+		elif self._section == 'junction':
+			self.junction_rows.append((row['th'], row['td']))
+
+
+class Breseq:
+	"""
+		Parses a directory of breseq analysis folders.
+		The tables are converted to DataFrames the first time they are used.
+		Parameters
+		----------
+		directory: Union[str, pathlib.Path]
+			The folder with one subfolder per breseq analysis.
+		jobs: int
+			The number of analysis folders to parse in parallel.
+		use_cache: bool
+			Whether to read and write the result cache.
+		rebuild_cache: bool
+			Whether to parse every sample again and overwrite the cache.
+		profile: bool
+			Whether to measure the time and memory used by each phase and each sample.
+	"""
+	def __init__(self, directory: Union[str, pathlib.Path], jobs: int = 1, use_cache: bool = True, rebuild_cache: bool = False, profile: bool = False):
+
+		self.data_folder = pathlib.Path(directory)
+		snp_tables, coverage_tables, junction_tables = _emptyTables()
+		self.errors = dict()
+		self.conversion_failures = dict()
+
+		self.cache = ResultCache(self.data_folder / CACHE_FOLDER_NAME, enabled = use_cache, rebuild = rebuild_cache)
+		self.profiler = Profiler(profile)
+
+		with self.profiler.phase('discovery'):
+			# Hidden folders (such as the cache folder) are not analysis folders.
+			folders = sorted(i for i in self.data_folder.iterdir() if i.is_dir() and not i.name.startswith('.'))
+		parse_sample = partial(_parseSample, cache = self.cache, profile = self.profiler.enabled)
+		if jobs and jobs > 1:
+			from concurrent.futures import ProcessPoolExecutor
+			with ProcessPoolExecutor(max_workers = jobs) as executor:
+				# `map` returns the results in the same order as `folders`, so the merged tables are identical to the serial path.
+				results = list(executor.map(parse_sample, folders))
+		else:
+			results = map(parse_sample, folders)
+
+		for sample_name, (snp_table, coverage_table, junction_table), error, profile_records in results:
+			self.profiler.extend(profile_records)
+			if error:
+				print("\tCould not parse {}: {}".format(sample_name, error))
+				self.errors[sample_name] = error
+				continue
+			failures = snp_table.failures + coverage_table.failures + junction_table.failures
+			if failures:
+				self.conversion_failures[sample_name] = failures
+			snp_tables.extend(snp_table)
+			coverage_tables.extend(coverage_table)
+			junction_tables.extend(junction_table)
+
+		self.builders = {'snp': snp_tables, 'coverage': coverage_tables, 'junction': junction_tables}
+
+	@classmethod
+	def fromOptions(cls, options) -> 'Breseq':
+		""" Parses the directory given on the command line. `options` is the namespace returned by `create_parser`."""
+		return cls(
+			options.directory,
+			jobs = getattr(options, 'jobs', 1),
+			use_cache = getattr(options, 'use_cache', True),
+			rebuild_cache = getattr(options, 'rebuild_cache', False),
+			profile = getattr(options, 'profile', False)
+		)
+
+	def _assemble(self, name: str) -> pandas.DataFrame:
+		with self.profiler.phase('assembly'):
+			return self.builders[name].toDataFrame()
+
+	@cached_property
+	def snp_table(self) -> pandas.DataFrame:
+		return self._assemble('snp')
+
+	@cached_property
+	def coverage_table(self) -> pandas.DataFrame:
+		return self._assemble('coverage')
+
+	@cached_property
+	def junction_table(self) -> pandas.DataFrame:
+		return self._assemble('junction')
+
+	@staticmethod
+	def findSourceFile(folder: pathlib.Path) -> Optional[pathlib.Path]:
+		"""
+			Locates the file to parse for an analysis folder. The GenomeDiff file (output.gd) is preferred,
+			and the index.html file is only used when the analysis folder does not have one.
+		Parameters
+		----------
+		folder: pathlib.Path
+			Path to a single analysis folder generated by breseq, or to the output.gd or index.html file itself.
+
+		Returns
+		-------
+			The path to the source file, or `None` if the folder does not have one.
+		"""
+		if folder.is_file():
+			return folder
+		candidates = [
+			folder / "output" / "output.gd",
+			folder / "output.gd",
+			folder / "output" / "index.html",
+			folder / "index.html"
+		]
+		for source_file in candidates:
+			if source_file.exists():
+				return source_file
+		return None
+
+	@classmethod
+	def parseAnalysisFolder(cls, folder: pathlib.Path, profiler: Profiler = None) -> Tuple[TableBuilder, TableBuilder, TableBuilder]:
+		"""
+
+		Parameters
+		----------
+		folder: pathlib.Path
+			Path to a single analysis folder generated by breseq.
+		profiler: Profiler
+			Records the time spent parsing the source file and building the tables.
+
+		Returns
+		-------
+			snp_table, coverage_table, junction_table
+
+		"""
+		print("parsing ", folder)
+		source_file = cls.findSourceFile(folder)
+		if source_file is None:
+			print("\tThe output.gd and index.html files are missing. Ignoring folder.")
+			return _emptyTables()
+		if profiler is None:
+			profiler = Profiler(enabled = False)
+		sample_name = folder.name
+		if source_file.suffix == '.gd':
+			print("\tGenomeDiff File: ", source_file)
+			# The GenomeDiff records are converted to rows as they are read, so there is no separate extraction phase.
+			with profiler.phase('parse', sample_name):
+				tables = cls._parseGenomeDiff(sample_name, source_file)
+		else:
+			print("\tIndex File: ", source_file)
+			with profiler.phase('parse', sample_name):
+				snp_headers, snp_rows, coverage_rows, junction_rows = cls._parseIndexFile(source_file)
+			with profiler.phase('extraction', sample_name):
+				tables = (
+					cls._parsePredictedMutations(sample_name, snp_headers, snp_rows),
+					cls._parseCoverage(sample_name, coverage_rows),
+					cls._parseJunctions(sample_name, junction_rows)
+				)
+		for table in tables:
+			if table.failures:
+				examples = ", ".join("{} = {!r}".format(column, value) for column, value in table.failures[:3])
+				print("\tCould not convert {} values ({})".format(len(table.failures), examples))
+		return tables
+
+	@classmethod
+	def _parseGenomeDiff(cls, sample_name: str, filename: pathlib.Path) -> Tuple[TableBuilder, TableBuilder, TableBuilder]:
+		"""
+			Builds the snp, coverage and junction tables from a GenomeDiff file. The columns match the
+			tables parsed from index.html. Only the missing coverage (MC) and new junction (JC) evidence that
+			is not assigned to a mutation is included, as in the 'Unassigned' tables of index.html.
+		Parameters
+		----------
+		sample_name: str
+			The name of the sample. Usually extracted from the name of the analysis folder.
+		filename: pathlib.Path
+			The output.gd file of a single analysis folder.
+
+		Returns
+		-------
+			snp_table, coverage_table, junction_table
+		"""
+		return cls._buildGenomeDiffTables(sample_name, iterGenomeDiff(filename))
+
+	@classmethod
+	def _buildGenomeDiffTables(cls, sample_name: str, records: Iterable[Dict[str, Any]]) -> Tuple[TableBuilder, TableBuilder, TableBuilder]:
+		""" Builds the snp, coverage and junction tables from the records of a GenomeDiff file, such as the ones yielded by `iterGenomeDiff`."""
+		mutations = list()
+		evidence = dict()
+		for record in records:
+			if record['type'] in GENOMEDIFF_MUTATION_FIELDS:
+				mutations.append(record)
+			elif record['type'] in GENOMEDIFF_EVIDENCE_FIELDS:
+				evidence[record['id']] = record
+
+		assigned = {parent for mutation in mutations for parent in mutation['parents']}
+		polymorphism_mode = any(float(mutation.get('frequency', 1)) != 1 for mutation in mutations)
+
+		snp_table, coverage_table, junction_table = _emptyTables()
+		for mutation in mutations:
+			parents = [evidence[i] for i in mutation['parents'] if i in evidence]
+			row = [
+				('Sample', sample_name),
+				('evidence', " ".join(parent['type'] for parent in parents)),
+				('seq id', mutation['seq_id']),
+				('position', mutation['position']),
+				('mutation', _formatGenomeDiffMutation(mutation, parents)),
+				('annotation', _stripHtml(mutation.get('html_mutation_annotation', _formatGenomeDiffAnnotation(mutation)))),
+				('gene', _stripHtml(mutation.get('html_gene_name', mutation.get('gene_name', '')))),
+				('description', _stripHtml(mutation.get('html_gene_product', mutation.get('gene_product', ''))))
+			]
+			if polymorphism_mode:
+				row.append(('freq %', round(float(mutation.get('frequency', 1)) * 100, 1)))
+			snp_table.append(row)
+
+		for item in evidence.values():
+			if item['id'] in assigned or 'reject' in item:
+				continue
+			if item['type'] == 'MC':
+				start, end = int(item['start']), int(item['end'])
+				row = [
+					('Sample', sample_name),
+					('seq id', item['seq_id']),
+					('start', start),
+					('end', end),
+					('size', end - start + 1),
+					('←cov', "{} [{}]".format(item.get('left_outside_cov', ''), item.get('left_inside_cov', ''))),
+					('cov→', "[{}] {}".format(item.get('right_inside_cov', ''), item.get('right_outside_cov', ''))),
+					('gene', _stripHtml(item.get('html_gene_name', item.get('gene_name', '')))),
+					('description', _stripHtml(item.get('gene_product', '')))
+				]
+				coverage_table.append(row)
+			elif item['type'] == 'JC':
+				for row in cls._genomeDiffJunctionRows(sample_name, item):
+					junction_table.append(row)
+
+		return snp_table, coverage_table, junction_table
+
+	@staticmethod
+	def _genomeDiffJunctionRows(sample_name: str, item: Dict[str, Any]) -> List[List[Tuple[str, str]]]:
+		""" Converts a JC record into the two rows (one per side of the junction) used by the junction table."""
+		from unidecode import unidecode
+		rows = list()
+		for side in ['side_1', 'side_2']:
+			position = "{:,}".format(int(item[side + '_position']))
+			# The '=' marks the side of the position that continues into the junction.
+			position = position + " =" if item[side + '_strand'] == '-1' else "= " + position
+			row = {
+				'seq id':               item[side + '_seq_id'],
+				'position':             position,
+				'reads (cov) (single)': "{} ({})".format(item.get(side + '_read_count', ''), item.get(side + '_coverage', '')),
+			}
+			if side == 'side_1':
+				frequency = item.get('frequency', item.get('new_junction_frequency'))
+				row['reads (cov)'] = "{} ({})".format(item.get('new_junction_read_count', ''), item.get('new_junction_coverage', ''))
+				row['score'] = "{}/{}".format(item.get('pos_hash_score', ''), item.get('max_pos_hash_score', ''))
+				row['skew'] = item.get('neg_log10_pos_hash_p_value', '')
+				row['freq'] = '' if frequency is None else "{:g}%".format(round(float(frequency) * 100, 1))
+			row['annotation'] = _stripHtml(item.get(side + '_gene_position', ''))
+			row['gene'] = _stripHtml(item.get(side + '_gene_name', ''))
+			if side == 'side_1':
+				row['product'] = _stripHtml(item.get(side + '_gene_product', ''))
+			rows.append([('Sample', sample_name)] + [(k, unidecode(v)) for k, v in row.items()])
+		return rows
+
+	@classmethod
+	def _parseIndexFile(cls, filename: pathlib.Path) -> Tuple[List[str], List[List[str]], List[TableRow], List[TableRow]]:
+		"""
+			Extracts the relevant tables from the index table.
+		Parameters
+		----------
+		filename: pathlib.Path
+			The path to the index file for a single output folder.
+
+		Returns
+		-------
+			snp_header, snp_rows, coverage_rows, junction_rows
+		"""
+		extractor = IndexFileExtractor()
+		with open(filename, 'r') as file1:
+			for line in file1:
+				extractor.feed(line)
+		extractor.close()
+
+		return extractor.snp_header, extractor.snp_rows, extractor.coverage_rows, extractor.junction_rows
+
+	@staticmethod
+	def _parsePredictedMutations(sample_name: str, headers: List[str], rows: List[List[str]]) -> TableBuilder:
+		"""
+			Parses the SNP table.
+		Parameters
+		----------
+		sample_name: str
+			The name of the sample. Usually extracted from the name of the analysis folder.
+		headers: List[str]
+			Column names for the snp table.
+		rows: List[List[str]]
+			The cell values of each row in the snp table.
+
+		Returns
+		-------
+
+		"""
+		snp_table = TableBuilder(SNP_SCHEMA)
+		# The frequency is shown as a percentage, such as '45.3%'.
+		headers = ['freq %' if column == 'freq' else column for column in map(_normalizeHeader, headers)]
+
+		for values in rows:
+			if len(values) > 1:
+				row = [(k, v[:-1] if k == 'freq %' else v) for k, v in zip(headers, values)]
+				row.append(('Sample', sample_name))
+				snp_table.append(row)
+		return snp_table
+
+	@staticmethod
+	def _parseCoverage(sample_name: str, rows: List[TableRow]) -> TableBuilder:
+		coverage_table = TableBuilder(COVERAGE_SCHEMA)
+		if len(rows) == 0:
+			print("\tCould not parse the coverage table.")
+			return coverage_table
+		column_names = [_normalizeHeader(i) for i in rows[0][0]]
+
+		for _, values in rows[1:]:
+			if len(values) > 1:
+				# The unnamed columns only hold links to the evidence pages.
+				row = [('Sample', sample_name)] + [(k, v) for k, v in zip(column_names, values) if k]
+				coverage_table.append(row)
+
+		return coverage_table
+
+	@staticmethod
+	def _parseJunctions(sample_name: str, rows: List[TableRow]) -> TableBuilder:
+		from unidecode import unidecode
+		junction_table = TableBuilder(JUNCTION_SCHEMA)
+		if len(rows) == 0:
+			print("\tCould not parse Junctino table.")
+			return junction_table
+		column_names, _ = rows[0]
+		rows = [values for _, values in rows[1:]]
+		column_names_a = ['0', '1'] + [_normalizeHeader(unidecode(i)) for i in column_names][1:]
+
+		column_names_a[4] = '{} ({})'.format(column_names_a[4], 'single')
+		column_names_b = [i for i in column_names_a if i not in ['reads (cov)', 'score', 'skew', 'freq', '0']]
+		for a_row, b_row in zip(rows[::2], rows[1::2]):
+			junction_table.append([('Sample', sample_name)] + [(k, unidecode(v)) for k, v in zip(column_names_a, a_row)])
+			junction_table.append([('Sample', sample_name)] + [(k, unidecode(v)) for k, v in zip(column_names_b, b_row)])
+		return junction_table
+
+	@staticmethod
+	def generateComparisonTable(snp_table: pandas.DataFrame, coverage: CoverageIndex = None) -> Optional[pandas.DataFrame]:
+		"""
+			Builds a presence/absence matrix of every (seq id, position) site in the snp table.
+		Parameters
+		----------
+		snp_table: pandas.DataFrame
+		coverage: CoverageIndex
+			The missing coverage regions of each sample. If given, sites that a sample does not have are marked
+			with '?' when they fall in one of the sample's missing coverage regions, since they could not have been called.
+
+		Returns
+		-------
+			A table with one row per site and one column per sample. A sample's cell is 'X' if the site occurs in
+			a single row of the snp table, '.' if it occurs in several rows, '?' if the sample has no coverage at the site
+			and empty if the sample does not have the site.
+			The 'all' column is '.' when the site has as many rows as there are samples.
+			Returns `None` if the snp table is empty.
+		"""
+		# Sample	annotation	description	evidence	gene	mutation	position	seq id
+		if any(column not in snp_table.columns for column in ['Sample', 'seq id', 'position']):
+			return None
+		number_of_samples = snp_table['Sample'].nunique()
+		sites = snp_table[['seq id', 'position', 'Sample']].dropna()
+		if sites.empty:
+			return None
+
+		site_groups = sites.groupby(by = ['seq id', 'position'], sort = True, observed = True)
+		site_codes = site_groups.ngroup().values
+		site_counts = site_groups.size()
+		sample_codes, sample_names = pandas.factorize(sites['Sample'], sort = True)
+
+		# The (site, sample) pairs are grouped by sample, and each sample's dense column of the site x sample table is filled
+		# from its own sites. Each column is a Categorical with one byte per site: 0 -> 'X', 1 -> '.', 2 -> '?', -1 -> missing.
+		marker_codes = numpy.where(site_counts.values == 1, 0, 1).astype(numpy.int8)
+		order = numpy.argsort(sample_codes, kind = 'stable')
+		boundaries = numpy.searchsorted(sample_codes[order], numpy.arange(len(sample_names) + 1))
+
+		comparison_table = site_counts.index.to_frame(index = False)
+		if coverage is not None:
+			sites = coverage.sortSites(comparison_table['seq id'].astype(object).values, comparison_table['position'].values)
+		sample_columns = dict()
+		for index, sample_name in enumerate(sample_names):
+			sample_sites = site_codes[order[boundaries[index]:boundaries[index + 1]]]
+			codes = numpy.full(len(site_counts), -1, dtype = numpy.int8)
+			if coverage is not None:
+				codes[coverage.missing(sample_name, sites)] = 2
+			codes[sample_sites] = marker_codes[sample_sites]
+			sample_columns[sample_name] = pandas.Categorical.from_codes(codes, categories = ['X', '.', '?'])
+		comparison_table = pandas.concat([comparison_table, pandas.DataFrame(sample_columns)], axis = 1)
+		comparison_table['all'] = numpy.where(site_counts.values == number_of_samples, '.', '')
+		return comparison_table
+
+	@cached_property
+	def comparison_table(self) -> Optional[pandas.DataFrame]:
+		""" The snp comparison table. Generated the first time it is used."""
+		return self.generateComparisonTable(self.snp_table, self.coverage_index)
+
+	@cached_property
+	def coverage_index(self) -> CoverageIndex:
+		""" The missing coverage regions of each sample."""
+		return CoverageIndex.fromTable(self.builders['coverage'])
+
+	def _formatComparisonWorksheet(self, worksheet):
+		from openpyxl import styles
+
+		for character in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ':
+			for index in range(1, len(self.snp_table)):
+				cell_index = character + str(index)
+				cell = worksheet[cell_index]
+				print(cell)
+				value = cell.value
+				if value == '.':
+
+					cell.fill = styles.Fill(bgColor = styles.Color('00000000'), fill_type = 'solid')
+				elif value == 'X':
+
+					cell.fill = styles.PatternFill(bgColor = styles.Color('12345678'), fill_type = 'solid')
+
+		return worksheet
+
+	def save(self, filename = 'breseq_output', filetype = 'xlsx')->None:
+		"""
+			Saves the parsed tables to a file.
+		Parameters
+		----------
+		filename: str
+			The name of the output file.
+		filetype: {'xlsx', 'tsv', 'csv', 'parquet', 'vcf', 'sqlite'}
+			The format of the output file.
+
+		Returns
+		-------
+
+		"""
+		filetype = filetype.lower()
+		filename = pathlib.Path(filename)
+		# The parquet datasets are saved as a folder, so an existing folder is the output itself.
+		if filename.is_dir() and filetype != 'parquet':
+			filename = filename / 'breseq_output'
+
+		print("Saving to ", filename)
+
+		if self.profiler.enabled:
+			# Generated here so that they are not counted as part of the save.
+			self.snp_table, self.coverage_table, self.junction_table
+			# Only the spreadsheet and the parquet dataset include the comparison table.
+			if filetype in ('xlsx', 'parquet'):
+				with self.profiler.phase('comparison'):
+					self.comparison_table
+		with self.profiler.phase('save'):
+			if filetype == 'xlsx':
+				self.to_excel(filename)
+			elif filetype == 'parquet':
+				self.to_parquet(filename)
+			elif filetype == 'vcf':
+				self.to_vcf(filename)
+			elif filetype == 'sqlite':
+				self.to_sqlite(filename)
+			else:
+				self.to_csv(filename, filetype)
+
+	@staticmethod
+	def _iterWorksheetRows(table: pandas.DataFrame, merged_columns: List[int] = None) -> Iterator[List[Any]]:
+		"""
+			Yields the header and each row of a table as a list of cell values. Missing values become empty cells.
+		Parameters
+		----------
+		table: pandas.DataFrame
+		merged_columns: List[int]
+			Columns whose cells span each pair of rows. The value of the second row of each pair is left empty.
+		"""
+		yield list(table.columns)
+		for index, row in enumerate(table.itertuples(index = False, name = None)):
+			row = [None if pandas.isna(value) else value for value in row]
+			if merged_columns and index % 2 == 1:
+				for column in merged_columns:
+					row[column] = None
+			yield row
+
+	@staticmethod
+	def _textCell(worksheet, value: str) -> WriteOnlyCell:
+		""" Junction positions such as '= 1,234' would otherwise be saved as formulas."""
+		from openpyxl.cell import WriteOnlyCell
+		cell = WriteOnlyCell(worksheet, value = value)
+		cell.data_type = 's'
+		return cell
+
+	def to_excel(self, filename:Union[str,pathlib.Path]):
+		"""
+			Saves the parsed table as an Excel spreadsheet. The rows are streamed to the workbook, which is only written once.
+		Parameters
+		----------
+		filename: str, pathlib.Path
+			The output file.
+
+		Returns
+		-------
+
+		"""
+		from openpyxl import Workbook, styles
+		from openpyxl.cell import WriteOnlyCell
+		from openpyxl.worksheet.cell_range import CellRange
+
+		if isinstance(filename, str):
+			filename = pathlib.Path(filename)
+		filename = filename.with_suffix('.xlsx')
+		# A write-only workbook keeps a constant amount of memory no matter how many rows are added.
+		workbook = Workbook(write_only = True)
+		header_font = styles.Font(bold = True)
+
+		sheets = [
+			('snps', self.snp_table),
+			('coverage', self.coverage_table),
+			('junctions', self.junction_table),
+			('snp comparison', self.comparison_table)
+		]
+		for sheet_name, table in sheets:
+			if table is None:
+				continue
+			worksheet = workbook.create_sheet(sheet_name)
+			merged_columns = None
+			if sheet_name == 'junctions':
+				# Both rows of a junction share these cells.
+				merged_columns = [
+					index
+					for index, column in enumerate(table.columns)
+					if column in ['Sample', 0, '0', 'freq', 'product', 'score']
+				]
+			rows = self._iterWorksheetRows(table, merged_columns)
+			header = list()
+			for value in next(rows):
+				cell = WriteOnlyCell(worksheet, value = value)
+				cell.font = header_font
+				header.append(cell)
+			worksheet.append(header)
+			for row in rows:
+				worksheet.append([self._textCell(worksheet, value) if isinstance(value, str) and value.startswith('=') else value for value in row])
+
+			if merged_columns:
+				for x in range(0, len(table) - 1, 2):
+					for column in merged_columns:
+						worksheet.merged_cells.add(CellRange(min_col = column + 1, min_row = x + 2, max_col = column + 1, max_row = x + 3))
+
+		workbook.save(filename)
+
+	def to_csv(self, folder: Union[str, pathlib.Path], filetype):
+		"""
+			Saves the parsed tables as csv/tsv files.
+		Parameters
+		----------
+		folder: Union[str,pathlib.Path]
+
+		filetype: {'csv', 'tsv'}
+
+		Returns
+		-------
+
+		"""
+		if isinstance(folder, str):
+			folder = pathlib.Path(folder)
+		extension = 'tsv' if filetype == 'tsv' else 'csv'
+		snp_filename = str(folder.with_name(folder.stem + '.snp.' + extension).absolute())
+		coverage_filename = str(folder.with_name(folder.stem + '.coverage.' + extension).absolute())
+		junction_filename = str(folder.with_name(folder.stem + '.junction.' + extension).absolute())
+
+		delimiter = '\t' if filetype == 'tsv' else ','
+		include_index = False
+
+		self.snp_table.to_csv(snp_filename, sep = delimiter, index = include_index)
+		self.coverage_table.to_csv(coverage_filename, sep = delimiter, index = include_index)
+		self.junction_table.to_csv(junction_filename, sep = delimiter, index = include_index)
+
+	@staticmethod
+	def _applyColumnarSchema(table: pandas.DataFrame, schema: Dict[str, str]) -> pandas.DataFrame:
+		""" Converts the columns of a table to the types given in `schema`. Values that are not numbers become missing values."""
+		table = table.copy()
+		for column in table.columns:
+			dtype = schema.get(column)
+			if dtype == 'category':
+				table[column] = table[column].astype('category')
+			elif dtype is not None:
+				values = pandas.to_numeric(table[column].astype(str).str.replace(',', ''), errors = 'coerce')
+				table[column] = values.round() if dtype == 'Int64' else values
+				table[column] = table[column].astype(dtype)
+			else:
+				table[column] = table[column].astype(object).where(table[column].notna(), None).astype('string')
+		return table
+
+	def to_parquet(self, folder: Union[str, pathlib.Path]):
+		"""
+			Saves the snp, coverage, junction and comparison tables as parquet datasets partitioned by sample.
+			Each table is saved to its own subfolder, with one 'Sample=<name>' folder per sample. The snp table gains a
+			'mutation type' column (SNP, DEL, INS, MOB, ...) inferred from the 'mutation' column. The comparison table is
+			saved in long format, with one row per (site, sample) pair where the sample has the site or has no coverage at it.
+		Parameters
+		----------
+		folder: Union[str,pathlib.Path]
+			The folder to save the datasets to.
+
+		Returns
+		-------
+
+		"""
+		folder = pathlib.Path(folder)
+		snp_table = self.snp_table
+		if 'mutation' in snp_table.columns:
+			snp_table = snp_table.assign(**{'mutation type': snp_table['mutation'].map(mutationType, na_action = 'ignore')})
+		tables = {
+			'snp':      snp_table,
+			'coverage': self.coverage_table,
+			'junction': self.junction_table
+		}
+		comparison_table = self.comparison_table
+		if comparison_table is not None:
+			comparison_table = comparison_table.melt(
+				id_vars = ['seq id', 'position', 'all'],
+				var_name = 'Sample',
+				value_name = 'marker'
+			)
+			tables['comparison'] = comparison_table[comparison_table['marker'].notna()]
+
+		for name, table in tables.items():
+			if 'Sample' not in table.columns:
+				continue
+			table = self._applyColumnarSchema(table, COLUMNAR_SCHEMA[name])
+			# Replaces the partitions written by a previous run instead of adding more files to them.
+			table.to_parquet(folder / name, partition_cols = ['Sample'], index = False, existing_data_behavior = 'delete_matching')
+
+	def to_vcf(self, filename: Union[str, pathlib.Path]):
+		"""
+			Saves the single-base substitutions in the snp table as a multi-sample VCF file compressed with bgzip,
+			along with a tabix index (.tbi) so that regions can be queried without reading the whole file.
+			The records are written one site at a time and are never held in memory together.
+			Other mutation types are skipped because the snp table does not include their reference sequence.
+			Samples without coverage at a site are given an unknown genotype ('.') rather than the reference allele.
+		Parameters
+		----------
+		filename: Union[str, pathlib.Path]
+			The output file. The '.vcf.gz' suffix is added if it is missing.
+
+		Returns
+		-------
+
+		"""
+		from bgzf import BgzfWriter, TabixIndex
+
+		filename = pathlib.Path(filename)
+		if not filename.name.endswith('.vcf.gz'):
+			filename = filename.with_name(filename.name + '.vcf.gz')
+		if 'mutation' not in self.snp_table.columns:
+			print("\tThere are no mutations to save.")
+			return
+
+		alleles = self.snp_table['mutation'].astype(str).str.extract(r'^([ACGTN])→([ACGTN])$')
+		snps = self.snp_table.assign(ref = alleles[0], alt = alleles[1]).dropna(subset = ['ref', 'seq id', 'position'])
+		skipped = len(self.snp_table) - len(snps)
+		if skipped:
+			print("\tSkipped {} mutations that are not single-base substitutions.".format(skipped))
+		snps = snps.assign(**{'seq id': snps['seq id'].astype(str)}).sort_values(['seq id', 'position'], kind = 'stable')
+
+		samples = sorted(self.snp_table['Sample'].dropna().unique())
+		sample_index = {sample: index for index, sample in enumerate(samples)}
+		has_frequency = 'freq %' in snps.columns
+		contigs = snps['seq id'].unique()
+
+		header = [
+			"##fileformat=VCFv4.2",
+			"##source=breseq_parser"
+		]
+		header += ["##contig=<ID={}>".format(contig) for contig in contigs]
+		header += [
+			'##INFO=<ID=NS,Number=1,Type=Integer,Description="Number of samples with the variant">',
+			'##FORMAT=<ID=GT,Number=1,Type=String,Description="Haploid genotype">',
+			'##FORMAT=<ID=AF,Number=1,Type=Float,Description="Frequency of the variant reported by breseq">',
+			"\t".join(["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"] + samples)
+		]
+
+		# The samples without coverage at each site, which have an unknown genotype rather than the reference allele.
+		sites = snps[['seq id', 'position']].drop_duplicates()
+		site_keys = list(zip(sites['seq id'].tolist(), sites['position'].astype(int).tolist()))
+		uncovered = dict()
+		sorted_sites = self.coverage_index.sortSites(sites['seq id'].values, sites['position'].values)
+		for sample in samples:
+			for site_number in self.coverage_index.missing(sample, sorted_sites).tolist():
+				uncovered.setdefault(site_keys[site_number], list()).append(sample_index[sample])
+
+		index = TabixIndex('vcf')
+		frequencies = (snps['freq %'] / 100).tolist() if has_frequency else [numpy.nan] * len(snps)
+		rows = zip(
+			snps['seq id'].tolist(), snps['position'].astype(int).tolist(), snps['ref'].tolist(),
+			snps['alt'].tolist(), snps['Sample'].tolist(), frequencies
+		)
+		with BgzfWriter(filename) as vcf_file:
+			vcf_file.write("\n".join(header) + "\n")
+			# The rows are sorted, so the rows of each site are next to each other.
+			for (seq_id, position, reference), site in itertools.groupby(rows, key = lambda row: row[:3]):
+				alternates = list()
+				carriers = set()
+				genotypes = ['0:.'] * len(samples)
+				for sample_number in uncovered.get((seq_id, position), []):
+					genotypes[sample_number] = '.:.'
+				for _, _, _, alternate, sample, frequency in site:
+					if alternate not in alternates:
+						alternates.append(alternate)
+					carriers.add(sample)
+					frequency = '.' if pandas.isna(frequency) else "{:g}".format(frequency)
+					genotypes[sample_index[sample]] = "{}:{}".format(alternates.index(alternate) + 1, frequency)
+				line = "\t".join([
+					seq_id, str(position), '.', reference, ",".join(alternates), '.', 'PASS',
+					"NS={}".format(len(carriers)), 'GT:AF'
+				] + genotypes) + "\n"
+
+				start_offset = vcf_file.tell()
+				vcf_file.write(line)
+				index.add(seq_id, position - 1, position - 1 + len(reference), start_offset, vcf_file.tell())
+
+		index.write(filename.with_name(filename.name + '.tbi'))
+
+	def to_sqlite(self, filename: Union[str, pathlib.Path]):
+		"""
+			Adds the parsed tables to a SQLite database, which is created if it does not exist. Samples that are already
+			in the database are replaced. See breseq_database.py to query it.
+		Parameters
+		----------
+		filename: Union[str, pathlib.Path]
+			The database file. The '.sqlite' suffix is added if the name does not have a suffix.
+		"""
+		from breseq_database import MutationDatabase
+
+		filename = pathlib.Path(filename)
+		if not filename.suffix:
+			filename = filename.with_suffix('.sqlite')
+		with MutationDatabase(filename) as database:
+			run_id = database.add_breseq(self)
+		print("\tAdded the tables to {} as run {}.".format(filename, run_id))
+
+
+class SiteIndex:
+	"""
+		Keeps the number of snp table rows at each (seq id, position) site for each sample, so that the comparison
+		table can be updated one sample at a time instead of being generated again from the whole snp table.
+		Each site is stored once and the samples only keep arrays of site ids and counts, so the index stays small
+		even with thousands of samples.
+		The table matches `Breseq.generateComparisonTable`, with the sites sorted by seq id and position.
+	"""
+	def __init__(self):
+		self._site_ids: Dict[Tuple[str, int], int] = dict()
+		self._sites: List[Tuple[str, int]] = list()
+		# The total number of rows at each site, indexed by site id.
+		self._counts = array('q')
+		# The sorted site ids of each sample and the number of rows at each of them.
+		self._samples: Dict[str, Tuple[array, array]] = dict()
+
+	def __len__(self) -> int:
+		return sum(1 for count in self._counts if count)
+
+	@staticmethod
+	def sitesOf(snp_table: TableBuilder) -> Dict[Tuple[str, int], int]:
+		""" Counts the rows at each site of a single sample's snp table."""
+		return Counter(
+			(seq_id, position)
+			for seq_id, position in zip(snp_table.values('seq id'), snp_table.values('position'))
+			if seq_id is not None and position is not None
+		)
+
+	def _siteId(self, site: Tuple[str, int]) -> int:
+		site_id = self._site_ids.get(site)
+		if site_id is None:
+			site_id = self._site_ids[site] = len(self._sites)
+			self._sites.append(site)
+			self._counts.append(0)
+		return site_id
+
+	def add(self, sample_name: str, sites: Dict[Tuple[str, int], int]) -> None:
+		""" Adds the site counts of a sample, replacing any counts previously added for it."""
+		self.remove(sample_name)
+		if not sites: return
+		pairs = sorted((self._siteId(site), count) for site, count in sites.items())
+		site_ids, counts = array('i', (i for i, _ in pairs)), array('i', (c for _, c in pairs))
+		self._samples[sample_name] = (site_ids, counts)
+		for site_id, count in pairs:
+			self._counts[site_id] += count
+
+	def remove(self, sample_name: str) -> None:
+		site_ids, counts = self._samples.pop(sample_name, (array('i'), array('i')))
+		for site_id, count in zip(site_ids, counts):
+			self._counts[site_id] -= count
+
+	def samples(self) -> List[str]:
+		""" The samples with at least one site, sorted by name."""
+		return sorted(self._samples)
+
+	def sites(self, sample_name: str) -> Dict[Tuple[str, int], int]:
+		site_ids, counts = self._samples.get(sample_name, (array('i'), array('i')))
+		return {self._sites[site_id]: count for site_id, count in zip(site_ids, counts)}
+
+	def iterRows(self, coverage: CoverageIndex = None, chunk_size: int = 10000) -> Iterator[List[Any]]:
+		"""
+			Yields the header of the comparison table followed by one row per site.
+			The sample columns are filled in for `chunk_size` sites at a time, so only that part of the table is ever in memory.
+			If `coverage` is given, sites in a sample's missing coverage regions are marked with '?'.
+		"""
+		samples = self.samples()
+		yield ['seq id', 'position'] + samples + ['all']
+		counts = numpy.frombuffer(self._counts, dtype = numpy.int64) if self._counts else numpy.zeros(0, dtype = numpy.int64)
+		live = [site_id for site_id in range(len(self._sites)) if self._counts[site_id]]
+		live.sort(key = self._sites.__getitem__)
+		# The row of each site id in the table, or -1 if no sample has the site anymore.
+		rows = numpy.full(len(self._sites), -1, dtype = numpy.int64)
+		rows[live] = numpy.arange(len(live))
+		sample_rows = list()
+		for sample_name in samples:
+			site_rows = rows[numpy.frombuffer(self._samples[sample_name][0], dtype = numpy.int32)]
+			sample_rows.append(numpy.sort(site_rows[site_rows >= 0]))
+
+		live = numpy.array(live, dtype = numpy.int64)
+		# 0 -> '', 1 -> 'X' (the site is in a single row of the snp table), 2 -> '.', 3 -> '?'
+		symbols = numpy.array(['', 'X', '.', '?'], dtype = object)
+		for start in range(0, len(live), chunk_size):
+			chunk = live[start:start + chunk_size]
+			chunk_counts = counts[chunk]
+			present = numpy.zeros((len(chunk), len(samples)), dtype = numpy.int8)
+			for column, site_rows in enumerate(sample_rows):
+				low, high = numpy.searchsorted(site_rows, [start, start + len(chunk)])
+				present[site_rows[low:high] - start, column] = 1
+			markers = numpy.where(chunk_counts == 1, 1, 2).astype(numpy.int8)
+			cells = present * markers[:, None]
+			if coverage is not None:
+				chunk_sites = coverage.sortSites(
+					[self._sites[site_id][0] for site_id in chunk.tolist()], [self._sites[site_id][1] for site_id in chunk.tolist()]
+				)
+				for column, sample_name in enumerate(samples):
+					missing = coverage.missing(sample_name, chunk_sites)
+					missing = missing[present[missing, column] == 0]
+					cells[missing, column] = 3
+			cells = symbols[cells]
+			all_column = numpy.where(chunk_counts == len(samples), '.', '')
+			for site_id, row, all_cell in zip(chunk.tolist(), cells.tolist(), all_column.tolist()):
+				yield list(self._sites[site_id]) + row + [all_cell]
+
+	def toDataFrame(self, coverage: CoverageIndex = None) -> Optional[pandas.DataFrame]:
+		rows = self.iterRows(coverage)
+		header = next(rows)
+		table = pandas.DataFrame(list(rows), columns = header)
+		if table.empty:
+			return None
+		for sample_name in self.samples():
+			table[sample_name] = pandas.Categorical(table[sample_name].replace('', None), categories = ['X', '.', '?'])
+		return table
+
+	def writeDelimited(self, filename: pathlib.Path, coverage: CoverageIndex = None, delimiter: str = '\t') -> None:
+		with open(filename, 'w', newline = '') as file1:
+			csv.writer(file1, delimiter = delimiter).writerows(self.iterRows(coverage))
+
+
+class OutputStore:
+	"""
+		A folder of parsed tables that samples are added to over time. Each sample's tables are saved as separate
+		files, so adding a sample never rewrites the tables of the others.
+		- snp/<sample>.tsv, coverage/<sample>.tsv, junction/<sample>.tsv
+		- comparison.tsv: the snp comparison table of every sample in the store.
+		- state.json: the source file each sample was parsed from, and the sites and missing coverage regions used by the comparison table.
+	Parameters
+	----------
+	folder: Union[str, pathlib.Path]
+		The folder to keep the tables in. Created if it does not exist.
+	"""
+	TABLES = ['snp', 'coverage', 'junction']
+	STATE_FILENAME = 'state.json'
+	COMPARISON_FILENAME = 'comparison.tsv'
+
+	def __init__(self, folder: Union[str, pathlib.Path]):
+		self.folder = pathlib.Path(folder)
+		self.sites = SiteIndex()
+		self.coverage = CoverageIndex()
+		self.samples: Dict[str, Dict[str, Any]] = dict()
+		for name in self.TABLES:
+			(self.folder / name).mkdir(parents = True, exist_ok = True)
+
+		state_filename = self.folder / self.STATE_FILENAME
+		if state_filename.exists():
+			with open(state_filename) as file1:
+				self.samples = json.load(file1)['samples']
+			# The sites and regions are only kept in the indexes, and are added back to the state when it is saved.
+			for sample_name, state in self.samples.items():
+				self.sites.add(sample_name, {(seq_id, position): count for seq_id, position, count in state.pop('sites', [])})
+				self.coverage.add(sample_name, state.pop('coverage', []))
+
+	def isCurrent(self, sample_name: str, source: pathlib.Path) -> bool:
+		""" Whether the sample was already added from this version of its source file."""
+		state = self.samples.get(sample_name)
+		return state is not None and state['key'] == ResultCache._key(source)
+
+	def add(self, sample_name: str, key: Dict[str, Any], tables: Tuple[TableBuilder, TableBuilder, TableBuilder], error: str = None) -> None:
+		"""
+			Saves the tables of a sample and updates the comparison sites. Replaces the sample if it was already in the store.
+		Parameters
+		----------
+		sample_name: str
+		key: Dict[str, Any]
+			Identifies the version of the source file that was parsed. See `ResultCache._key`.
+		tables: Tuple[TableBuilder, TableBuilder, TableBuilder]
+			The snp, coverage and junction tables of the sample.
+		error: str
+			If the sample could not be parsed. It is recorded so that the same file is not parsed again.
+		"""
+		state = {'key': key}
+		if error:
+			state['error'] = error
+			self.sites.remove(sample_name)
+			self.coverage.remove(sample_name)
+		else:
+			for name, table in zip(self.TABLES, tables):
+				filename = self.folder / name / (sample_name + '.tsv')
+				temporary_filename = filename.with_suffix('.tmp')
+				table.writeDelimited(temporary_filename)
+				temporary_filename.replace(filename)
+			self.sites.add(sample_name, SiteIndex.sitesOf(tables[0]))
+			coverage_table = tables[1]
+			self.coverage.add(sample_name, zip(coverage_table.values('seq id'), coverage_table.values('start'), coverage_table.values('end')))
+		self.samples[sample_name] = state
+
+	def remove(self, sample_name: str) -> None:
+		""" Deletes the tables of a sample from the store."""
+		for name in self.TABLES:
+			(self.folder / name / (sample_name + '.tsv')).unlink(missing_ok = True)
+		self.sites.remove(sample_name)
+		self.coverage.remove(sample_name)
+		self.samples.pop(sample_name, None)
+
+	def save(self) -> None:
+		""" Writes the comparison table and the state file. Called once after a batch of samples is added."""
+		for filename, write in [(self.COMPARISON_FILENAME, partial(self.sites.writeDelimited, coverage = self.coverage)), (self.STATE_FILENAME, self._writeState)]:
+			filename = self.folder / filename
+			temporary_filename = filename.with_suffix('.tmp')
+			write(temporary_filename)
+			temporary_filename.replace(filename)
+
+	def _writeState(self, filename: pathlib.Path) -> None:
+		# Written one sample at a time so the sites of every sample are never converted to json at once.
+		with open(filename, 'w') as file1:
+			file1.write('{{"parser_version": {}, "samples": {{'.format(PARSER_VERSION))
+			for index, (sample_name, state) in enumerate(self.samples.items()):
+				state = dict(
+					state,
+					sites = [[seq_id, position, count] for (seq_id, position), count in self.sites.sites(sample_name).items()],
+					coverage = self.coverage.regions(sample_name)
+				)
+				file1.write('{}{}: {}'.format(', ' if index else '', json.dumps(sample_name), json.dumps(state)))
+			file1.write('}}')
+
+	def readTable(self, name: str) -> pandas.DataFrame:
+		""" Loads one of the 'snp', 'coverage' or 'junction' tables of every sample in the store."""
+		filenames = sorted((self.folder / name).glob('*.tsv'))
+		tables = [pandas.read_csv(filename, sep = '\t', dtype = str, keep_default_na = False) for filename in filenames]
+		return pandas.concat(tables, ignore_index = True) if tables else pandas.DataFrame()
+
+
+def _parseFolders(pending: List[Tuple[pathlib.Path, Dict[str, Any]]], cache: ResultCache, jobs: int = 1) -> Iterator[Tuple[Dict[str, Any], Tuple[str, Tuple[TableBuilder, TableBuilder, TableBuilder], Optional[str], List[Dict[str, Any]]]]]:
+	"""
+		Parses each (folder, key) pair with `_parseSample` and yields the key with the result, in the order of `pending`.
+	Parameters
+	----------
+	pending: List[Tuple[pathlib.Path, Dict[str, Any]]]
+		The analysis folders to parse and the key of the version of each source file, as given by `ResultCache._key`.
+	cache: ResultCache
+	jobs: int
+		The number of analysis folders to parse in parallel. At most twice this many parsed samples wait to be saved at once.
+	"""
+	if not jobs or jobs <= 1:
+		for folder, key in pending:
+			yield key, _parseSample(folder, cache)
+		return
+	from concurrent.futures import ProcessPoolExecutor
+	# Only a few samples are submitted ahead of the one being saved, rather than every sample at once,
+	# so finished samples cannot pile up in memory while the first ones are saved.
+	with ProcessPoolExecutor(max_workers = jobs) as executor:
+		futures = deque()
+		for folder, key in pending:
+			futures.append((key, executor.submit(_parseSample, folder, cache)))
+			if len(futures) >= 2 * jobs:
+				key, future = futures.popleft()
+				yield key, future.result()
+		while futures:
+			key, future = futures.popleft()
+			yield key, future.result()
+
+
+def streamBreseq(directory: Union[str, pathlib.Path], output: Union[str, pathlib.Path], jobs: int = 1, use_cache: bool = True, rebuild_cache: bool = False) -> OutputStore:
+	"""
+		Parses a directory of breseq analysis folders into an `OutputStore` with bounded memory. Each sample's tables are
+		saved as soon as the sample is parsed and are then released, so only the comparison sites of every sample are
+		kept in memory. Samples already in the store from an unchanged source file are not parsed again, and
+		samples that are no longer in the directory are removed from the store.
+	Parameters
+	----------
+	directory: Union[str, pathlib.Path]
+		The folder with one subfolder per breseq analysis.
+	output: Union[str, pathlib.Path]
+		The folder of the `OutputStore`.
+	jobs: int
+		The number of analysis folders to parse in parallel. At most twice this many parsed samples wait to be saved at once.
+	use_cache: bool
+		Whether to read and write the result cache.
+	rebuild_cache: bool
+		Whether to parse every sample again and overwrite the cache.
+
+	Returns
+	-------
+		The output store.
+	"""
+	directory = pathlib.Path(directory)
+	store = OutputStore(output)
+	cache = ResultCache(directory / CACHE_FOLDER_NAME, enabled = use_cache, rebuild = rebuild_cache)
+	folders = sorted(i for i in directory.iterdir() if i.is_dir() and not i.name.startswith('.'))
+
+	for sample_name in set(store.samples) - {folder.name for folder in folders}:
+		print("Removing {}, which is no longer in {}".format(sample_name, directory))
+		store.remove(sample_name)
+
+	pending = list()
+	for folder in folders:
+		source_file = Breseq.findSourceFile(folder)
+		if source_file is None:
+			print("\tThe output.gd and index.html files are missing from {}. Ignoring folder.".format(folder))
+			continue
+		if store.isCurrent(folder.name, source_file) and not rebuild_cache:
+			continue
+		# The key is taken before parsing, so a file that changes while it is parsed is parsed again on the next run.
+		pending.append((folder, ResultCache._key(source_file)))
+
+	for key, (sample_name, tables, error, _) in _parseFolders(pending, cache, jobs):
+		if error:
+			print("\tCould not parse {}: {}".format(sample_name, error))
+		store.add(sample_name, key, tables, error)
+	store.save()
+	print("Saved {} samples to {} ({} parsed in this run).".format(len(store.samples), store.folder, len(pending)))
+	return store
+
+
+def watchDirectory(
+		directory: Union[str, pathlib.Path], output: Union[str, pathlib.Path], interval: float = 60, settle: float = 120, once: bool = False,
+		jobs: int = 1, use_cache: bool = True, rebuild_cache: bool = False
+	) -> OutputStore:
+	"""
+		Polls a directory of breseq analysis folders and adds each folder to an `OutputStore` once breseq has finished with it.
+		A folder is finished when its output.gd or index.html file exists and has not changed for `settle` seconds
+		(and, after the first poll, since the previous poll). Folders already in the store are only parsed again if their source file changes.
+		Folders that cannot be read or saved are reported and tried again on the next poll.
+	Parameters
+	----------
+	directory: Union[str, pathlib.Path]
+		The folder the analysis folders are written to.
+	output: Union[str, pathlib.Path]
+		The folder of the `OutputStore`.
+	interval: float
+		Seconds between polls.
+	settle: float
+		Seconds a source file must be left unchanged before it is parsed.
+	once: bool
+		Check the directory a single time and return, rather than polling forever.
+	jobs: int
+		The number of analysis folders to parse in parallel at each poll.
+	use_cache: bool
+		Whether to read and write the result cache.
+	rebuild_cache: bool
+		Whether to parse the finished folders again instead of loading them from the cache, and overwrite the cache.
+		Folders already in the store from an unchanged source file are still skipped.
+
+	Returns
+	-------
+		The output store.
+	"""
+	directory = pathlib.Path(directory)
+	store = OutputStore(output)
+	cache = ResultCache(directory / CACHE_FOLDER_NAME, enabled = use_cache, rebuild = rebuild_cache)
+	print("Watching {} ({} samples already in {})".format(directory, len(store.samples), store.folder))
+	# The (size, modification time) of each source file at the previous poll.
+	previous = dict()
+	first_poll = True
+	# Whether samples were added that the comparison table and state file don't include yet.
+	unsaved = False
+	while True:
+		pending = list()
+		try:
+			folders = sorted(i for i in directory.iterdir() if i.is_dir() and not i.name.startswith('.'))
+		except OSError as exception:
+			print("Could not list {}: {}".format(directory, exception))
+			folders = []
+		for folder in folders:
+			try:
+				source_file = Breseq.findSourceFile(folder)
+				if source_file is None:
+					continue
+				stat = source_file.stat()
+				signature = (stat.st_size, stat.st_mtime_ns)
+				last_signature = previous.get(folder.name)
+				previous[folder.name] = signature
+				if store.isCurrent(folder.name, source_file):
+					continue
+				if time.time() - stat.st_mtime < settle:
+					continue
+				# Files that were already old on the first poll are not waited on for another interval.
+				if not (once or first_poll) and last_signature != signature:
+					continue
+				# The key is taken before parsing, so a file that changes while it is parsed is parsed again on the next poll.
+				pending.append((folder, ResultCache._key(source_file)))
+			except OSError as exception:
+				# The folder was removed or rewritten after it was listed.
+				print("\tCould not read {}: {}".format(folder, exception))
+		first_poll = False
+
+		added = list()
+		for key, (sample_name, tables, error, _) in _parseFolders(pending, cache, jobs):
+			if error:
+				print("\tCould not parse {}: {}".format(sample_name, error))
+			try:
+				store.add(sample_name, key, tables, error)
+			except OSError as exception:
+				print("\tCould not save {}: {}".format(sample_name, exception))
+				continue
+			added.append(sample_name)
+
+		if added or unsaved:
+			try:
+				store.save()
+				unsaved = False
+			except OSError as exception:
+				print("Could not save {}: {}".format(store.folder, exception))
+				unsaved = True
+			if added:
+				print("Added {} samples to {}: {}".format(len(added), store.folder, ", ".join(added)))
+		if once:
+			return store
+		time.sleep(interval)
+
+
+def parseBreseq(directory: Union[str, pathlib.Path], jobs: int = 1, use_cache: bool = True, rebuild_cache: bool = False, as_dataframes: bool = True) -> Dict[str, Any]:
+	"""
+		Parses a directory of breseq analysis folders without going through the command line.
+		Only pandas is imported, and only when `as_dataframes` is True.
+	Parameters
+	----------
+	directory: Union[str, pathlib.Path]
+		The folder with one subfolder per breseq analysis.
+	jobs: int
+		The number of analysis folders to parse in parallel.
+	use_cache: bool
+		Whether to read and write the result cache.
+	rebuild_cache: bool
+		Whether to parse every sample again and overwrite the cache.
+	as_dataframes: bool
+		If False, each table is a dict mapping column names to lists of values instead of a DataFrame.
+
+	Returns
+	-------
+		A dict with the 'snp', 'coverage' and 'junction' tables.
+	"""
+	breseq = Breseq(directory, jobs = jobs, use_cache = use_cache, rebuild_cache = rebuild_cache)
+	if as_dataframes:
+		return {'snp': breseq.snp_table, 'coverage': breseq.coverage_table, 'junction': breseq.junction_table}
+	return {name: builder.toDict()['columns'] for name, builder in breseq.builders.items()}
+
+
+if __name__ == "__main__":
+	if DEBUG:
+		test_folder = pathlib.Path(__file__).parent / 'test_data'
+		args = Parser(test_folder, 'xlsx', test_folder.with_name('test_output.xlsx'))
+	else:
+		args = create_parser().parse_args()
+		if args.profile_output:
+			args.profile = True
+	data_folder = args.directory
+	output_file = pathlib.Path(args.filename)
+	if not data_folder or not pathlib.Path(data_folder).is_dir():
+		print("This is not a valid folder: ", data_folder)
+		print("Please Enter a valid Directory to parse, try the --help flag if you have questions, exiting!")
+		exit(1)
+
+	if args.watch:
+		watchDirectory(
+			data_folder, args.filename, interval = args.interval, settle = args.settle, once = args.once,
+			jobs = args.jobs, use_cache = args.use_cache, rebuild_cache = args.rebuild_cache
+		)
+		exit(0)
+	if args.stream:
+		streamBreseq(data_folder, args.filename, jobs = args.jobs, use_cache = args.use_cache, rebuild_cache = args.rebuild_cache)
+		exit(0)
+
+	obj = Breseq.fromOptions(args)
+	obj.save(args.filename, args.filetype)
+	obj.profiler.report(args.profile_output)
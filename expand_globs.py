@@ -0,0 +1,18 @@
+"""
+	Expands the glob patterns given on the command line, for shells such as cmd.exe that pass them on unexpanded.
+"""
+import glob
+from pathlib import Path
+from typing import Iterable, List
+
+
+def expand_globs(patterns: Iterable[str]) -> List[Path]:
+	"""
+		Expands each pattern that has a wildcard, such as 'models/*/*.treefile' or 'plates/**/*.txt', into the sorted
+		paths it matches. Patterns without a wildcard are kept as they are, even if the file doesn't exist.
+	"""
+	paths = list()
+	for pattern in patterns:
+		matches = sorted(glob.glob(pattern, recursive = True)) if any(character in pattern for character in '*?[') else [pattern]
+		paths += [Path(i) for i in matches]
+	return paths
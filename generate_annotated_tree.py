@@ -2,10 +2,13 @@
 	Annotates a phylogenic tree using a pre-generated newick file and the comparison table generated by the isolate_parsers package.
 """
 import argparse
+import html
+import json
 import re
 from pathlib import Path
-from typing import Dict, List
-from ete3 import TextFace, Tree
+from typing import Any, Dict, List, Tuple
+from ete3 import Tree
+import numpy
 import pandas
 
 
@@ -19,6 +22,13 @@ def create_parser() -> argparse.ArgumentParser:
 
 	parser.add_argument("tree", help = "A pre-generated tree in newick format.", type = Path)
 	parser.add_argument("output", help = "Filename for the output svg file.")
+	parser.add_argument(
+		"--no-render",
+		help = "Skip drawing the tree. The mutations of each clade are saved as json and as iTOL label and popup datasets instead, "
+		"using the output filename without its suffix.",
+		action = 'store_false',
+		dest = 'render'
+	)
 
 	return parser
 
@@ -34,6 +44,57 @@ def find_ortholog(locus_tag: str, locus_tag_map: Dict[str, str]):
 		return locus_tag.replace(' -', '')
 
 
+def get_sample_columns(comparison: pandas.DataFrame) -> List[str]:
+	return [i for i in comparison.columns if '-' in str(i)]
+
+
+def get_carrier_masks(comparison: pandas.DataFrame, sample_columns: List[str]) -> List[int]:
+	"""
+		Encodes the samples that carry each mutation as a bitset, where bit `i` is set if the sample in `sample_columns[i]` has the mutation.
+	Parameters
+	----------
+	comparison: pandas.DataFrame
+	sample_columns: List[str]
+
+	Returns
+	-------
+	List[int]
+		One bitset per row of the comparison table.
+	"""
+	carriers = comparison[sample_columns].ne(comparison['ref'], axis = 0).values
+	packed = numpy.packbits(carriers, axis = 1, bitorder = 'little')
+	return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+
+def limit_mutations(mutation_list: List[str], limit: int = 20) -> List[str]:
+	if len(mutation_list) > limit:
+		mutation_list = mutation_list[:limit] + [f"+{len(mutation_list) - limit} more"]
+	return mutation_list
+
+
+def get_clade_mutations(comparison: pandas.DataFrame) -> Tuple[List[str], Dict[int, List[str]]]:
+	"""
+		Groups the mutations in the comparison table by the exact set of samples that carry them.
+	Returns
+	-------
+	sample_columns: List[str]
+		The samples, in the order of the bits of each bitset.
+	clade_mutations: Dict[int, List[str]]
+		Maps the bitset of each group of samples to the descriptions of the mutations that only those samples have.
+	"""
+	sample_columns = get_sample_columns(comparison)
+	masks = get_carrier_masks(comparison, sample_columns)
+	carrier_counts = comparison[sample_columns].ne(comparison['ref'], axis = 0).sum(axis = 1)
+	# Mutations reported in samples other than the ones that differ from the reference can't belong to a single clade.
+	selected = (comparison['presentIn'] == carrier_counts).values
+
+	clade_mutations = dict()
+	for mask, is_selected, description in zip(masks, selected, comparison['description']):
+		if is_selected and isinstance(description, str) and description:
+			clade_mutations.setdefault(mask, list()).append(description)
+	return sample_columns, clade_mutations
+
+
 def get_common_mutations(comparison: pandas.DataFrame, samples: List[str]) -> List[str]:
 	""" Gets a list of mutations that only appear in these samples.
 		Parameters
@@ -42,39 +103,127 @@ def get_common_mutations(comparison: pandas.DataFrame, samples: List[str]) -> Li
 		samples: List[str]
 			A list of the sample ids or names to get common mutations for.
 	"""
-	sample_columns = [i for i in comparison_table.columns if '-' in i]
-	other_columns = [i for i in comparison_table.columns if i not in sample_columns]
-	reduced = comparison[samples + other_columns]
+	sample_columns = get_sample_columns(comparison)
+	masks = get_carrier_masks(comparison, sample_columns)
+	sample_mask = sum(1 << sample_columns.index(sample) for sample in set(samples))
 
 	# Find all sites that contain the mutation.
-	selection = reduced[samples[0]] != reduced['ref']
-	for sample in samples[1:]:
-		selection = selection & (reduced[sample] != reduced['ref'])
-
-	selection = selection[selection]
-	mutations = reduced.loc[selection.index]
+	selection = [(mask & sample_mask) == sample_mask for mask in masks]
+	mutations = comparison[selection]
 
 	mutations = mutations[mutations['presentIn'] == len(samples)]['description']
 	mutation_list = mutations.dropna().tolist()
 	mutation_list = [i for i in mutation_list if i]
-	if len(mutation_list) > 20:
-		mutation_list = mutation_list[:20] + [f"+{len(mutation_list) - 20} more"]
-	return mutation_list
+	return limit_mutations(mutation_list)
 
-def add_common_mutations_to_tree(comparison_table:pandas.DataFrame, tree:Tree):
-	seen = list()
+
+def add_common_mutations_to_tree(comparison_table: pandas.DataFrame, tree: Tree, render: bool = True):
+	"""
+		Labels each unnamed node of the tree with the mutations shared by all of its leaves and no other sample.
+		The bitset of the leaves under each node is built from its children in a single postorder pass, so each node
+		only needs a dictionary lookup rather than a scan of the comparison table.
+	Parameters
+	----------
+	comparison_table: pandas.DataFrame
+	tree: Tree
+	render: bool
+		Whether to add the mutations to the nodes as faces to draw. Otherwise they are only stored in the `mutations`
+		feature of each node and the node names are left as-is.
+	"""
+	if render:
+		# Importing the faces requires a Qt installation, which isn't needed when the tree is not drawn.
+		from ete3 import TextFace
+	sample_columns, clade_mutations = get_clade_mutations(comparison_table)
+	sample_bits = {sample: 1 << index for index, sample in enumerate(sample_columns)}
+
+	clade_masks = dict()
+	for node in tree.traverse('postorder'):
+		if node.is_leaf():
+			clade_masks[node] = sample_bits.get(node.name, 0) if node.name != 'reference' else 0
+		else:
+			mask = 0
+			for child in node.children:
+				mask |= clade_masks[child]
+			clade_masks[node] = mask
+
+	seen = set()
 	for node in tree.traverse('preorder'):
 		if not node.name:
-			leafs = [i.name for i in node if i.name != 'reference']
-			common_mutations = get_common_mutations(comparison_table, leafs)
+			common_mutations = limit_mutations(clade_mutations.get(clade_masks[node], []))
 			common_mutations = [i for i in common_mutations if i not in seen]
 			common_mutations = [i for i in common_mutations if i.strip()]
-			seen += common_mutations
+			seen.update(common_mutations)
 
 			node.add_features(mutations = common_mutations)
-			node.name = common_mutations
-			tx = TextFace("\n".join(common_mutations))
-			node.add_face(tx, column = 0, position = "branch-top")
+			if render:
+				node.name = common_mutations
+				tx = TextFace("\n".join(common_mutations))
+				node.add_face(tx, column = 0, position = "branch-top")
+
+
+def get_node_id(node: Tree) -> str:
+	""" Identifies a node the way iTOL does: by its name if it is a leaf, or by two leaves whose last common ancestor it is."""
+	if node.is_leaf():
+		return node.name
+	first_leaf = next(node.children[0].iter_leaves())
+	last_leaf = next(node.children[-1].iter_leaves())
+	if first_leaf is last_leaf:
+		# A node with a single child shares its leaves with that child, so it can't be told apart.
+		last_leaf = list(node.iter_leaves())[-1]
+	return f"{first_leaf.name}|{last_leaf.name}"
+
+
+def get_clade_annotations(tree: Tree) -> List[Dict[str, Any]]:
+	""" Collects the nodes that were labelled with at least one mutation."""
+	annotations = list()
+	for node in tree.traverse('preorder'):
+		mutations = getattr(node, 'mutations', None)
+		if mutations:
+			annotations.append({
+				'node': get_node_id(node),
+				'leaves': len(node),
+				'mutations': mutations
+			})
+	return annotations
+
+
+def save_clade_annotations(annotations: List[Dict[str, Any]], filename: Path) -> List[Path]:
+	"""
+		Saves the mutations of each clade as json, an iTOL LABELS dataset and an iTOL POPUP_INFO dataset.
+	Parameters
+	----------
+	annotations: List[Dict[str, Any]]
+		The output of `get_clade_annotations`.
+	filename: Path
+		The suffix of each file is appended to this filename.
+
+	Returns
+	-------
+	List[Path]
+		The files that were written.
+	"""
+	json_filename = filename.with_name(filename.name + '.json')
+	labels_filename = filename.with_name(filename.name + '.itol.labels.txt')
+	popup_filename = filename.with_name(filename.name + '.itol.popup.txt')
+
+	json_filename.write_text(json.dumps(annotations, indent = 2))
+
+	def clean(value: str) -> str:
+		# iTOL datasets are tab-separated with one node per line.
+		return re.sub(r"\s+", " ", value).strip()
+
+	labels = ["LABELS", "SEPARATOR TAB", "DATA"]
+	popups = ["POPUP_INFO", "SEPARATOR TAB", "DATA"]
+	for annotation in annotations:
+		mutations = [clean(i) for i in annotation['mutations']]
+		label = mutations[0] if len(mutations) == 1 else f"{mutations[0]} (+{len(mutations) - 1})"
+		labels.append(f"{annotation['node']}\t{label}")
+		content = "<br>".join(html.escape(i) for i in mutations)
+		popups.append(f"{annotation['node']}\t{annotation['leaves']} samples\t{content}")
+
+	labels_filename.write_text("\n".join(labels) + "\n")
+	popup_filename.write_text("\n".join(popups) + "\n")
+	return [json_filename, labels_filename, popup_filename]
 
 if __name__ == "__main__":
 	args = create_parser().parse_args()
@@ -84,6 +233,11 @@ if __name__ == "__main__":
 
 	tree = Tree(tree_filename.read_text())
 
-	add_common_mutations_to_tree(comparison_table, tree)
+	add_common_mutations_to_tree(comparison_table, tree, render = args.render)
 
-	tree.render(args.output)
+	if args.render:
+		tree.render(args.output)
+	else:
+		output_filename = Path(args.output)
+		for filename in save_clade_annotations(get_clade_annotations(tree), output_filename.with_name(output_filename.stem)):
+			print("Saved", filename)
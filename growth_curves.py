@@ -0,0 +1,248 @@
+"""
+	Computes growth curve metrics for every well of one or more plates from the plate reader.
+	Each metric is computed for all 96 wells of a plate at once, from the (time, row, column) array made by `plate_reader`.
+"""
+import argparse
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy
+import pandas
+
+from expand_globs import expand_globs
+from plate_reader import PlateCube, read_plate_cube
+
+
+def create_parser() -> argparse.ArgumentParser:
+	parser = argparse.ArgumentParser(description = "Summarizes the growth curve of each well of one or more plates.")
+	parser.add_argument(
+		"plates",
+		help = "The files generated by the plate reader, or plates saved as .npy by plate_reader.py. Glob patterns are expanded.",
+		nargs = '+'
+	)
+	parser.add_argument(
+		"-o", "--output",
+		help = "The summary table. Saved as csv, xlsx or tab-separated text depending on the suffix.",
+		type = Path,
+		default = Path("growth_summary.tsv")
+	)
+	parser.add_argument(
+		"--blanks",
+		help = "Wells with only media, such as 'A1 H12'. Their mean at each read is subtracted from every well.",
+		nargs = '*',
+		default = []
+	)
+	parser.add_argument(
+		"--smooth",
+		help = "The number of reads in the moving average used to smooth each curve. 1 disables smoothing.",
+		type = int,
+		default = 1
+	)
+	parser.add_argument(
+		"--window",
+		help = "The number of reads used to fit the growth rate at each point of the curve.",
+		type = int,
+		default = 5
+	)
+	parser.add_argument(
+		"--min-od",
+		help = "Readings at or below this value are too close to the blank to compute a growth rate from.",
+		type = float,
+		default = 0.001,
+		dest = 'min_od'
+	)
+	return parser
+
+
+def get_wells() -> List[str]:
+	""" The name of each well, in the order of the flattened (row, column) axes of a PlateCube."""
+	return [f"{row}{column}" for row in PlateCube.ROWS for column in PlateCube.COLUMNS]
+
+
+def subtract_blanks(values: numpy.ndarray, blank_wells: Iterable[str]) -> numpy.ndarray:
+	"""
+		Subtracts the mean of the blank wells at each read from every well.
+	Parameters
+	----------
+	values: numpy.ndarray
+		A (time, well) array.
+	blank_wells: Iterable[str]
+		The names of the blank wells, such as 'A1'.
+	"""
+	wells = get_wells()
+	columns = [wells.index(well.upper()) for well in blank_wells]
+	if not columns:
+		return values
+	blanks = values[:, columns]
+	counts = (~numpy.isnan(blanks)).sum(axis = 1)
+	# Reads where every blank is missing are left as they are.
+	background = numpy.where(counts > 0, numpy.nansum(blanks, axis = 1) / numpy.maximum(counts, 1), 0)
+	return values - background[:, None]
+
+
+def smooth(values: numpy.ndarray, window: int) -> numpy.ndarray:
+	""" Smooths each column of a (time, well) array with a centered moving average. Missing readings are ignored."""
+	if window <= 1:
+		return values
+	return pandas.DataFrame(values).rolling(window, center = True, min_periods = 1).mean().to_numpy()
+
+
+def rolling_sum(values: numpy.ndarray, window: int) -> numpy.ndarray:
+	""" Sums each run of `window` consecutive rows of an array."""
+	totals = numpy.cumsum(values, axis = 0)
+	totals = numpy.concatenate([numpy.zeros((1,) + values.shape[1:]), totals])
+	return totals[window:] - totals[:-window]
+
+
+def fit_growth_rates(hours: numpy.ndarray, log_values: numpy.ndarray, window: int) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+	"""
+		Fits a line to the log of each well over every run of `window` consecutive reads.
+	Parameters
+	----------
+	hours: numpy.ndarray
+		The time of each read.
+	log_values: numpy.ndarray
+		A (time, well) array of the natural log of each reading. Runs with missing values are not fit.
+	window: int
+
+	Returns
+	-------
+	slopes, mean_hours, mean_log_values: numpy.ndarray
+		(time - window + 1, well) arrays of the slope of each fit and the point the line passes through.
+	"""
+	valid = ~numpy.isnan(log_values)
+	t = numpy.where(valid, hours[:, None], 0)
+	y = numpy.where(valid, log_values, 0)
+
+	count = rolling_sum(valid.astype(float), window)
+	sum_t = rolling_sum(t, window)
+	sum_y = rolling_sum(y, window)
+	sum_tt = rolling_sum(t * t, window)
+	sum_ty = rolling_sum(t * y, window)
+
+	denominator = count * sum_tt - sum_t ** 2
+	complete = (count == window) & (denominator > 0)
+	denominator = numpy.where(complete, denominator, 1)
+	slopes = numpy.where(complete, (count * sum_ty - sum_t * sum_y) / denominator, numpy.nan)
+	count = numpy.maximum(count, 1)
+	return slopes, sum_t / count, sum_y / count
+
+
+def area_under_curve(hours: numpy.ndarray, values: numpy.ndarray) -> numpy.ndarray:
+	"""
+		Integrates each column of a (time, well) array over time with the trapezoid rule, using only the valid reads of each well.
+		Gaps between valid reads are bridged by a straight line, and the area before a well's first or after its last valid read is not counted.
+	"""
+	filled = pandas.DataFrame(values, index = hours).interpolate(method = 'values', limit_area = 'inside').to_numpy()
+	segments = (filled[1:] + filled[:-1]) / 2 * numpy.diff(hours)[:, None]
+	return numpy.nansum(segments, axis = 0)
+
+
+def analyze_growth(cube: PlateCube, blanks: Iterable[str] = (), smoothing: int = 1, window: int = 5, min_od: float = 0.001) -> pandas.DataFrame:
+	"""
+		Computes the growth metrics of every well of a plate.
+	Parameters
+	----------
+	cube: PlateCube
+	blanks: Iterable[str]
+		Wells with only media. Their mean is subtracted from every well before anything else.
+	smoothing: int
+		The number of reads in the moving average applied to each curve after the blanks are subtracted.
+	window: int
+		The number of reads used to fit the growth rate at each point.
+	min_od: float
+		Readings at or below this value are left out of the growth rate fits.
+
+	Returns
+	-------
+	pandas.DataFrame
+		One row per well with:
+		- 'max OD': the highest reading.
+		- 'max growth rate': the highest specific growth rate (1/hour), fit to the log of the readings.
+		- 'doubling time': the doubling time at the highest growth rate, in hours.
+		- 'lag time': the hours from the first read until the tangent at the highest growth rate crosses the first reading.
+		- 'area under curve': the area under the readings over time (OD * hours).
+	"""
+	hours = cube.seconds / 3600
+	values = cube.values.reshape(len(cube), len(PlateCube.ROWS) * len(PlateCube.COLUMNS)).astype(float)
+	values = smooth(subtract_blanks(values, blanks), smoothing)
+
+	has_values = ~numpy.isnan(values).all(axis = 0)
+	max_od = numpy.where(has_values, numpy.max(numpy.where(numpy.isnan(values), -numpy.inf, values), axis = 0, initial = -numpy.inf), numpy.nan)
+
+	area = numpy.where(has_values, area_under_curve(hours, values), numpy.nan)
+
+	with numpy.errstate(invalid = 'ignore', divide = 'ignore'):
+		log_values = numpy.log(numpy.where(values > min_od, values, numpy.nan))
+
+	growth_rate = numpy.full(values.shape[1], numpy.nan)
+	lag_time = numpy.full(values.shape[1], numpy.nan)
+	if len(cube) >= window:
+		slopes, mean_hours, mean_log_values = fit_growth_rates(hours, log_values, window)
+		best = numpy.argmax(numpy.where(numpy.isnan(slopes), -numpy.inf, slopes), axis = 0)
+		wells = numpy.arange(values.shape[1])
+		growth_rate = slopes[best, wells]
+		# The lag ends where the tangent line crosses the log of the first reading. Blank-subtracted readings
+		# often start at or below `min_od`, which is used instead.
+		initial = numpy.log(numpy.fmax(values[0], min_od))
+		with numpy.errstate(invalid = 'ignore', divide = 'ignore'):
+			lag_time = mean_hours[best, wells] - hours[0] - (mean_log_values[best, wells] - initial) / growth_rate
+		growth_rate = numpy.where(growth_rate > 0, growth_rate, numpy.nan)
+		lag_time = numpy.where(numpy.isnan(growth_rate), numpy.nan, numpy.maximum(lag_time, 0))
+
+	with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+		doubling_time = numpy.log(2) / growth_rate
+
+	return pandas.DataFrame({
+		'well':             get_wells(),
+		'row':              numpy.repeat(PlateCube.ROWS, len(PlateCube.COLUMNS)),
+		'column':           numpy.tile(PlateCube.COLUMNS, len(PlateCube.ROWS)),
+		'max OD':           max_od,
+		'max growth rate':  growth_rate,
+		'doubling time':    doubling_time,
+		'lag time':         lag_time,
+		'area under curve': area
+	})
+
+
+def load_plate(filename: Union[str, Path]) -> PlateCube:
+	filename = Path(filename)
+	if filename.suffix == '.npy':
+		return PlateCube.load(filename)
+	return read_plate_cube(filename)
+
+
+def analyze_plates(filenames: Iterable[Path], **kwargs) -> Optional[pandas.DataFrame]:
+	""" Runs `analyze_growth` on each plate and combines the results into a single table with a 'plate' column."""
+	tables = list()
+	for filename in filenames:
+		table = analyze_growth(load_plate(filename), **kwargs)
+		table.insert(0, 'plate', Path(filename).stem)
+		tables.append(table)
+	if not tables:
+		return None
+	return pandas.concat(tables, ignore_index = True)
+
+
+def save_summary(table: pandas.DataFrame, output_filename: Path) -> None:
+	if output_filename.suffix == '.xlsx':
+		table.to_excel(str(output_filename), index = False)
+	else:
+		sep = ',' if output_filename.suffix == '.csv' else '\t'
+		table.to_csv(str(output_filename), sep = sep, index = False)
+
+
+def main():
+	args = create_parser().parse_args()
+	filenames = expand_globs(args.plates)
+
+	table = analyze_plates(filenames, blanks = args.blanks, smoothing = args.smooth, window = args.window, min_od = args.min_od)
+	if table is None:
+		print("No plates match", " ".join(args.plates))
+		return
+	save_summary(table, args.output)
+	print(f"Saved the growth metrics of {len(filenames)} plates to {args.output}")
+
+
+if __name__ == "__main__":
+	main()
@@ -1,11 +1,13 @@
+from array import array
 from pathlib import Path
 import itertools
-from typing import List, Dict, Union
+import json
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Union
+import numpy
 import pandas
 import argparse
 
-BlockDict = Dict[str, Union[str, List[str]]]
-
 parser = argparse.ArgumentParser()
 
 parser.add_argument(
@@ -18,7 +20,8 @@ parser.add_argument(
 
 parser.add_argument(
 	'-o', '--output',
-	help = 'The output filename. If it is a folder, or the output not given, the new table will be saved with the same filename as the original file.',
+	help = 'The output filename. If it is a folder, or the output not given, the new table will be saved with the same filename as the original file. '
+	'If it ends with .npy, the readings are saved as a (time, row, column) array instead, with the times and temperatures in a .axes.json file next to it.',
 	action = 'store',
 	dest = 'output',
 	default = None,
@@ -26,37 +29,144 @@ parser.add_argument(
 )
 
 
-def parse_time_block(block: List[str]) -> List[BlockDict]:
-	timepoint = block[0][0]
-	temperature = block[0][1]
-	wells = list()
-	for row_label, line in zip('ABCDEFGH', block):
-		for col_label, value in zip(range(1, 13), line[3:]):
-			row = {
-				'time':        timepoint,
-				'temperature': temperature,
-				'row':         row_label,
-				'column':      col_label,
-				'value':       value
-			}
-			wells.append(row)
-	return wells
+def iter_lines(filename: Path) -> Iterator[List[str]]:
+	""" Reads the plate reader export one line at a time, skipping the header, and splits each line into its fields."""
+	with filename.open(encoding = 'iso-8859-15') as file1:
+		for line in itertools.islice(file1, 3, None):
+			yield line.rstrip('\n').split('\t')
+
+
+def iter_time_blocks(contents: Iterable[List[str]]) -> Iterator[List[List[str]]]:
+	"""
+		Splits the lines of the file into separate timeblocks, which are separated by blank lines.
+		Each block is yielded as soon as it is complete. Stops at the '~End' marker or at the end of the file.
+	"""
+	block = list()
+	for line in contents:
+		if any(i != '' for i in line):
+			block.append(line)
+			continue
+		if block:
+			if '~End' in itertools.chain.from_iterable(block):
+				return
+			yield block
+		block = list()
+	# The file ended without an '~End' marker.
+	if block and '~End' not in itertools.chain.from_iterable(block):
+		yield block
 
 
 def extract_time_blocks(contents: List[List[str]]) -> List[List[str]]:
 	""" Splits the contents of the file into separate timeblocks."""
-	blocks = list()
-	while True:
-		block = list(itertools.takewhile(lambda s: any(i != '' for i in s), contents))
-
-		if '~End' in itertools.chain.from_iterable(block):
-			break
-		blocks.append(block)
-		contents = contents[len(block) + 1:]
-	return blocks
-
-
-def save_table(table: List[Dict[str, str]], output_filename) -> None:
+	return list(iter_time_blocks(contents))
+
+
+def to_float(value: str) -> float:
+	""" Converts a reading to a number. Empty and unreadable wells, such as 'OVRFLW', are NaN."""
+	try:
+		return float(value)
+	except ValueError:
+		return math.nan
+
+
+class PlateCube:
+	"""
+		The readings of a plate as a (time, row, column) array of floats.
+	Parameters
+	----------
+	times: numpy.ndarray
+		The time of each read, as written by the plate reader.
+	temperatures: numpy.ndarray
+		The temperature of each read.
+	values: numpy.ndarray
+		The readings, with one 8x12 plate per read. Missing and unreadable wells are NaN.
+	"""
+	ROWS = numpy.array(list('ABCDEFGH'))
+	COLUMNS = numpy.arange(1, 13)
+
+	def __init__(self, times: numpy.ndarray, temperatures: numpy.ndarray, values: numpy.ndarray):
+		self.times = times
+		self.temperatures = temperatures
+		self.values = values
+
+	def __len__(self) -> int:
+		return len(self.times)
+
+	@classmethod
+	def from_blocks(cls, blocks: Iterable[List[List[str]]]) -> 'PlateCube':
+		"""
+			Builds the cube from the time blocks of a plate reader export. Each block is converted to numbers as soon as
+			it is read, so only the readings themselves are kept in memory rather than the text of the whole file.
+		"""
+		times = list()
+		temperatures = array('d')
+		values = array('d')
+		for block in blocks:
+			times.append(block[0][0])
+			temperatures.append(to_float(block[0][1]))
+			plate = [math.nan] * (len(cls.ROWS) * len(cls.COLUMNS))
+			for row_index, line in enumerate(block[:len(cls.ROWS)]):
+				offset = row_index * len(cls.COLUMNS)
+				for column_index, value in enumerate(line[3:3 + len(cls.COLUMNS)]):
+					plate[offset + column_index] = to_float(value)
+			values.extend(plate)
+
+		return cls(
+			times = numpy.array(times, dtype = str),
+			temperatures = numpy.frombuffer(temperatures, dtype = float),
+			values = numpy.frombuffer(values, dtype = float).reshape(len(times), len(cls.ROWS), len(cls.COLUMNS))
+		)
+
+	@property
+	def seconds(self) -> numpy.ndarray:
+		""" The time of each read in seconds."""
+		return pandas.to_timedelta(pandas.Series(self.times, dtype = object)).dt.total_seconds().to_numpy()
+
+	def to_table(self, start: int = 0, stop: int = None) -> pandas.DataFrame:
+		""" Reshapes the reads between `start` and `stop` into the long table, with one row per well per read."""
+		values = self.values[start:stop]
+		wells = len(self.ROWS) * len(self.COLUMNS)
+		return pandas.DataFrame({
+			'time':        numpy.repeat(self.times[start:stop], wells),
+			'temperature': numpy.repeat(self.temperatures[start:stop], wells),
+			'row':         numpy.tile(numpy.repeat(self.ROWS, len(self.COLUMNS)), len(values)),
+			'column':      numpy.tile(self.COLUMNS, len(self.ROWS) * len(values)),
+			'value':       values.reshape(-1)
+		})
+
+	def iter_tables(self, chunk_size: int = 1000) -> Iterator[pandas.DataFrame]:
+		""" Yields the long table `chunk_size` reads at a time."""
+		for start in range(0, max(len(self), 1), chunk_size):
+			yield self.to_table(start, start + chunk_size)
+
+	def save(self, filename: Path) -> None:
+		""" Saves the readings as a .npy array, which can be memory-mapped by `load`, and the times and temperatures as json."""
+		numpy.save(filename, self.values)
+		axes = {
+			'time':        self.times.tolist(),
+			'temperature': [None if numpy.isnan(i) else i for i in self.temperatures.tolist()],
+			'row':         self.ROWS.tolist(),
+			'column':      self.COLUMNS.tolist()
+		}
+		filename.with_suffix('.axes.json').write_text(json.dumps(axes))
+
+	@classmethod
+	def load(cls, filename: Path, mmap: bool = True) -> 'PlateCube':
+		""" Loads a cube saved with `save`. The readings are memory-mapped unless `mmap` is False."""
+		axes = json.loads(filename.with_suffix('.axes.json').read_text())
+		return cls(
+			times = numpy.array(axes['time'], dtype = str),
+			temperatures = numpy.array(axes['temperature'], dtype = float),
+			values = numpy.load(filename, mmap_mode = 'r' if mmap else None)
+		)
+
+
+def read_plate_cube(filename: Union[str, Path]) -> PlateCube:
+	""" Reads a plate reader export into a PlateCube."""
+	return PlateCube.from_blocks(iter_time_blocks(iter_lines(Path(filename))))
+
+
+def save_table(table: Union[List[Dict[str, Any]], pandas.DataFrame], output_filename) -> None:
 	""" Saves the table."""
 	df = pandas.DataFrame(table, columns = ['time', 'temperature', 'row', 'column', 'value'])
 	if output_filename.suffix == '.xlsx':
@@ -69,6 +179,17 @@ def save_table(table: List[Dict[str, str]], output_filename) -> None:
 		df.to_csv(str(output_filename), sep = ext, index = False)
 
 
+def write_table(tables: Iterable[pandas.DataFrame], output_filename: Path) -> None:
+	""" Saves the table one part at a time, so the whole table never has to be held in memory. Excel files are still written all at once."""
+	if output_filename.suffix == '.xlsx':
+		save_table(pandas.concat(tables, ignore_index = True), output_filename)
+		return
+	ext = ',' if output_filename.suffix == '.csv' else '\t'
+	with output_filename.open('w', newline = '') as file1:
+		for index, table in enumerate(tables):
+			table.to_csv(file1, sep = ext, index = False, header = index == 0, lineterminator = '\n')
+
+
 def parse_plate_reader(filename: Union[str, Path], output_filename: Path = None):
 	""" Parses the output of the plate reader."""
 	filename = Path(filename)
@@ -77,13 +198,13 @@ def parse_plate_reader(filename: Union[str, Path], output_filename: Path = None)
 	elif output_filename.is_dir():
 		output_filename = output_filename / (filename.stem + '.tsv')
 
-	contents = [i.split("\t") for i in filename.read_text('iso-8859-15').split("\n")][3:]
-
-	blocks = extract_time_blocks(contents)
+	cube = read_plate_cube(filename)
 
-	table = list(itertools.chain.from_iterable(parse_time_block(block) for block in blocks))
-
-	save_table(table, output_filename)
+	if output_filename.suffix == '.npy':
+		cube.save(output_filename)
+	else:
+		write_table(cube.iter_tables(), output_filename)
+	return cube
 
 def main():
 	args = parser.parse_args()